@@ -7,105 +7,348 @@ Author: Mahesh Venkitachalam
 """
 
 import argparse
+import json
 import math
+import os
+import time
+from fractions import Fraction
 import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.animation as animation
-from scipy.spatial.distance import squareform, pdist
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from numpy.linalg import norm
 
 width, height = 640, 480
 
+def stateFileName(fileName):
+    """returns fileName with the .npz extension that np.savez() adds"""
+    fileName = os.fspath(fileName)
+    return fileName if fileName.endswith('.npz') else fileName + '.npz'
+
 class Boids:
     """Class that represents Boids simulation"""
-    def __init__(self, N):
-        """ initialize the Boid simulation"""
-        # init position & velocities
-        self.pos = [width/2.0, height/2.0] + 10*np.random.rand(2*N).reshape(N, 2)
-        # normalized random velocities
-        angles = 2*math.pi*np.random.rand(N)
-        self.vel = np.array(list(zip(np.cos(angles), np.sin(angles))))
-        self.N = N
+    def __init__(self, N, seed=None, size=(width, height), periodic=False,
+                 uniform=False, deterministic=False):
+        """ initialize the Boid simulation
+
+        size gives the box dimensions, so its length sets the number of 
+        dimensions. with periodic=True boids wrap around the box and see 
+        neighbors across its faces. with uniform=True boids start spread 
+        over the whole box instead of in a clump at the center. the
+        clump is 10 units wide for small flocks and grows with N (up to
+        half the box) so that large flocks don't start with every pair
+        of boids as neighbors.
+        with deterministic=True (which needs a seed) runs are bit-for-bit 
+        reproducible across machines: only correctly rounded arithmetic 
+        is used and all sums are taken in a fixed order.
+        """
+        if deterministic and seed is None:
+            raise ValueError('deterministic mode needs a seed')
+        self.deterministic = deterministic
+        # random number generator - seed it for repeatable runs
+        self.rng = np.random.default_rng(seed)
+        # box size and dimensions
+        self.size = np.array(size, dtype=float)
+        self.dims = len(self.size)
+        self.periodic = periodic
+        # preallocated storage: pos, vel are views of the first N rows
+        self.posBuf = np.zeros((max(N, 16), self.dims))
+        self.velBuf = np.zeros_like(self.posBuf)
+        self.headBuf = np.zeros_like(self.posBuf)
+        self.setCount(0)
         # min dist of approach
         self.minDist = 25.0
+        # neighborhood radius for alignment and cohesion
+        self.alignDist = 50.0
+        # init position & velocities
+        if uniform:
+            self.spawn(self.size*self.rng.random((N, self.dims)))
+        else:
+            self.spawn(self.size/2.0 +
+                       self.clumpSize(N)*self.rng.random((N, self.dims)))
         # max magnitude of velocities calculated by "rules"
         self.maxRuleVel = 0.03
         # max maginitude of final velocity
         self.maxVel = 2.0
+        # throughput of the last step() call in boid-steps/second
+        self.stepRate = 0.0
+        # time steps taken so far
+        self.steps = 0
+
+    def clumpSize(self, N, maxPairs=5e6):
+        """returns the side of the starting clump of N boids: 10 units,
+        or more if N boids in a clump that size would have more than
+        about maxPairs pairs of neighbors, but at most half the box"""
+        d = self.dims
+        # a whole number of units, found with exact arithmetic - roots
+        # from the math library could change the start positions in
+        # their last bits. the cube around the neighborhood of a boid
+        # bounds it, for about N*N*cube/(2*side**d) pairs in the clump.
+        cube = (2*Fraction(self.alignDist))**d
+        def fewPairs(side):
+            return N*N*cube <= 2*Fraction(maxPairs)*side**d
+        side = max(10, math.ceil((N*N*float(cube)/(2*maxPairs))**(1.0/d)))
+        while side > 10 and fewPairs(side - 1):
+            side -= 1
+        while not fewPairs(side):
+            side += 1
+        return np.minimum(float(side), self.size/2.0)
+
+    def setCount(self, N):
+        """set the number of active boids and refresh the array views"""
+        self.N = N
+        self.pos = self.posBuf[:N]
+        self.vel = self.velBuf[:N]
+        self.headPos = self.headBuf[:N]
+
+    def randomHeadings(self, k):
+        """returns k random unit vectors"""
+        if self.deterministic:
+            # rejection sampling in the unit ball avoids sin/cos/log, 
+            # whose last bits can differ between math libraries
+            vel = np.zeros((0, self.dims))
+            while len(vel) < k:
+                v = 2*self.rng.random((2*(k - len(vel)) + 8, self.dims)) - 1
+                mag2 = self.sumSquares(v)
+                v = v[(mag2 > 1e-6) & (mag2 <= 1.0)]
+                vel = np.concatenate((vel, v))
+            vel = vel[:k]
+            return vel/np.sqrt(self.sumSquares(vel))[:, np.newaxis]
+        if self.dims == 2:
+            angles = 2*math.pi*self.rng.random(k)
+            return np.column_stack((np.cos(angles), np.sin(angles)))
+        # normalized gaussian vectors point uniformly in all directions
+        vel = self.rng.standard_normal((k, self.dims))
+        return vel/norm(vel, axis=1)[:, np.newaxis]
+
+    def spawn(self, pos, vel=None):
+        """add boids at positions pos (k x dims) with velocities vel, 
+        random unit velocities if vel is not given"""
+        pos = np.asarray(pos, dtype=float).reshape(-1, self.dims)
+        k = len(pos)
+        if vel is None:
+            vel = self.randomHeadings(k)
+        N = self.N
+        # grow storage by doubling, so adding boids is O(1) amortized
+        if N + k > len(self.posBuf):
+            capacity = max(N + k, 2*len(self.posBuf))
+            for name in ('posBuf', 'velBuf', 'headBuf'):
+                buf = np.zeros((capacity, self.dims))
+                buf[:N] = getattr(self, name)[:N]
+                setattr(self, name, buf)
+        self.posBuf[N:N+k] = pos
+        self.velBuf[N:N+k] = vel
+        self.setCount(N + k)
+
+    def despawn(self, indices):
+        """remove the boids at the given indices by moving the last
+        active boids into their slots"""
+        # only the k removed indices are looked at, so this is O(k)
+        indices = np.asarray(indices, dtype=int).reshape(-1)
+        if np.any((indices < -self.N) | (indices >= self.N)):
+            raise IndexError('boid index out of range')
+        indices = np.unique(np.where(indices < 0, indices + self.N, indices))
+        N = self.N - len(indices)
+        # slots to fill below N, and boids in [N, old N) that survive -
+        # there are as many of each
+        holes = indices[indices < N]
+        movers = np.setdiff1d(np.arange(N, self.N), indices[indices >= N],
+                              assume_unique=True)
+        self.posBuf[holes] = self.posBuf[movers]
+        self.velBuf[holes] = self.velBuf[movers]
+        self.setCount(N)
+
+    def step(self, n=1, traj=None):
+        """Advance the simulation by n time steps without any drawing.
+
+        If traj is given, it must be an (n, N, dims) array (see 
+        newTrajectory()) and the positions after each step are recorded 
+        into it.
+        """
+        if traj is not None and traj.shape != (n, self.N, self.dims):
+            raise ValueError('trajectory shape {} does not match {}'
+                             .format(traj.shape, (n, self.N, self.dims)))
+        t0 = time.perf_counter()
+        for i in range(n):
+            # apply rules:
+            self.vel += self.applyRules()
+            self.limit(self.vel, self.maxVel)
+            self.pos += self.vel
+            self.applyBC()
+            # record positions
+            if traj is not None:
+                traj[i] = self.pos
+            self.steps += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed > 0:
+            self.stepRate = n*self.N/elapsed
+        return self.stepRate
+
+    def newTrajectory(self, n, fileName=None):
+        """returns a preallocated (n, N, dims) float32 trajectory array,
+        memory-mapped to a .npy file if fileName is given"""
+        shape = (n, self.N, self.dims)
+        if fileName:
+            return np.lib.format.open_memmap(fileName, mode='w+', 
+                                             dtype=np.float32, shape=shape)
+        return np.empty(shape, np.float32)
 
     def tick(self, frameNum, pts, head):
         """Update the simulation by one time step."""
-        # apply rules:
-        self.vel += self.applyRules()
-        self.limit(self.vel, self.maxVel)
-        self.pos += self.vel
-        self.applyBC()
-        # update data
-        pts.set_data(self.pos.reshape(2*self.N)[::2], 
-                     self.pos.reshape(2*self.N)[1::2])
-        vec = self.pos + 10*self.vel/self.maxVel
-        head.set_data(vec.reshape(2*self.N)[::2], 
-                      vec.reshape(2*self.N)[1::2])
-
-    def limitVec(self, vec, maxVal):
-        """limit magnitide of 2D vector"""
-        mag = norm(vec)
-        if mag > maxVal:
-            vec[0], vec[1] = vec[0]*maxVal/mag, vec[1]*maxVal/mag
-    
+        self.step()
+        self.draw(pts, head)
+
+    def draw(self, pts, head):
+        """update plot data straight from the simulation arrays"""
+        pts.set_data(self.pos[:, 0], self.pos[:, 1])
+        np.multiply(self.vel, 10/self.maxVel, out=self.headPos)
+        self.headPos += self.pos
+        head.set_data(self.headPos[:, 0], self.headPos[:, 1])
+
     def limit(self, X, maxVal):
-        """limit magnitide of 2D vectors in array X to maxValue"""
-        for vec in X:
-            self.limitVec(vec, maxVal)
+        """limit magnitide of vectors in array X to maxValue"""
+        # magnitudes of all vectors in one shot
+        mag = np.sqrt(self.sumSquares(X))
+        # scale down only the vectors that exceed maxVal
+        scale = np.divide(maxVal, mag, out=np.ones_like(mag), where=mag > maxVal)
+        X *= scale[:, np.newaxis]
             
     def applyBC(self):
         """apply boundary conditions"""
+        if self.periodic:
+            np.mod(self.pos, self.size, out=self.pos)
+            # mod of a tiny negative value can round up to the box size
+            np.copyto(self.pos, 0.0, where=self.pos >= self.size)
+            return
         deltaR = 2.0
-        for coord in self.pos:
-            if coord[0] > width + deltaR:
-                coord[0] = - deltaR
-            if coord[0] < - deltaR:
-                coord[0] = width + deltaR    
-            if coord[1] > height + deltaR:
-                coord[1] = - deltaR
-            if coord[1] < - deltaR:
-                coord[1] = height + deltaR
-    
+        # wrap coordinates that have gone past the edges
+        over = self.pos > self.size + deltaR
+        under = self.pos < - deltaR
+        np.copyto(self.pos, - deltaR, where=over)
+        np.copyto(self.pos, np.broadcast_to(self.size + deltaR, 
+                                            self.pos.shape), where=under)
+
+    def sumSquares(self, X):
+        """returns the squared magnitude of each row of X, summed over the 
+        dimensions in a fixed order"""
+        sq = X[:, 0]*X[:, 0]
+        for d in range(1, X.shape[1]):
+            sq += X[:, d]*X[:, d]
+        return sq
+
+    def neighbors(self, radius):
+        """find all ordered pairs (i, j), i != j, of boids closer than 
+        radius using a k-d tree. returns (i, j, disp) where disp holds 
+        the displacements pos[j] - pos[i]."""
+        boxsize = self.size if self.periodic else None
+        tree = cKDTree(self.pos, boxsize=boxsize)
+        pairs = tree.query_pairs(radius, output_type='ndarray')
+        # each pair counts for both boids
+        i = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        j = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        disp = self.pos[j] - self.pos[i]
+        if self.periodic:
+            # shortest displacement across the box faces
+            disp -= self.size*np.round(disp/self.size)
+        # strict threshold as in the rules below
+        close = self.sumSquares(disp) < radius*radius
+        i, j, disp = i[close], j[close], disp[close]
+        if self.deterministic:
+            # the tree's pair order may vary, so sort to fix summation order
+            order = np.lexsort((j, i))
+            i, j, disp = i[order], j[order], disp[order]
+        return i, j, disp
+
+    def sumOver(self, i, X):
+        """sum the rows of X into the boids given by index array i"""
+        sums = np.zeros((self.N, self.dims))
+        # bincount() of no pairs at all returns ints, so fill a float array
+        for d in range(self.dims):
+            sums[:, d] = np.bincount(i, X[:, d], minlength=self.N)
+        return sums
+
     def applyRules(self):
-        # get pairwise distances
-        self.distMatrix = squareform(pdist(self.pos))
+        # get neighbor pairs within the larger radius - the tree search 
+        # avoids computing all N^2 distances
+        i, j, disp = self.neighbors(max(self.minDist, self.alignDist))
+        dist2 = self.sumSquares(disp)
+
         # apply rule #1 - Separation
-        D = self.distMatrix < self.minDist
-        vel = self.pos*D.sum(axis=1).reshape(self.N, 1) - D.dot(self.pos)
+        near = dist2 < self.minDist**2
+        vel = -self.sumOver(i[near], disp[near])
         self.limit(vel, self.maxRuleVel)
 
         # different distance threshold
-        D = self.distMatrix < 50.0
+        near = dist2 < self.alignDist**2
+        i, j, disp = i[near], j[near], disp[near]
 
         # apply rule #2 - Alignment
-        vel2 = D.dot(self.vel)
+        vel2 = self.vel + self.sumOver(i, self.vel[j])
         self.limit(vel2, self.maxRuleVel)
         vel += vel2;
 
         # apply rule #1 - Cohesion
-        vel3 = D.dot(self.pos) - self.pos
+        # (sum of neighbor positions, seen from each boid)
+        count = np.bincount(i, minlength=self.N)
+        vel3 = self.pos*count[:, np.newaxis] + self.sumOver(i, disp)
         self.limit(vel3, self.maxRuleVel)
         vel += vel3
 
         return vel
 
+    def save_state(self, fileName):
+        """save a checkpoint of the simulation to a .npz file. like
+        np.savez(), .npz is added to fileName if it is missing."""
+        fileName = stateFileName(fileName)
+        rngState = json.dumps(self.rng.bit_generator.state)
+        np.savez(fileName, pos=self.pos, vel=self.vel, size=self.size,
+                 params=np.array([self.minDist, self.alignDist, 
+                                  self.maxRuleVel, self.maxVel]),
+                 flags=np.array([self.periodic, self.deterministic]),
+                 steps=self.steps, 
+                 rng=np.frombuffer(rngState.encode(), np.uint8))
+
+    @classmethod
+    def load_state(cls, fileName):
+        """returns a Boids simulation restored from a save_state() file,
+        with .npz added to fileName if it is missing"""
+        with np.load(stateFileName(fileName)) as data:
+            periodic, deterministic = data['flags']
+            boids = cls(0, seed=0, size=data['size'], 
+                        periodic=bool(periodic), 
+                        deterministic=bool(deterministic))
+            boids.spawn(data['pos'], data['vel'])
+            (boids.minDist, boids.alignDist, 
+             boids.maxRuleVel, boids.maxVel) = data['params'].tolist()
+            boids.steps = int(data['steps'])
+            boids.rng.bit_generator.state = json.loads(
+                data['rng'].tobytes().decode())
+        return boids
+
+    def orderParameter(self):
+        """returns the magnitude of the mean heading: 1 when all boids 
+        fly the same way, close to 0 when headings are random"""
+        mag = norm(self.vel, axis=1)
+        heading = self.vel/np.maximum(mag, 1e-12)[:, np.newaxis]
+        return norm(heading.mean(axis=0))
+
+    def clusterCount(self):
+        """returns the number of flocks, i.e. groups of boids linked by 
+        neighbors closer than alignDist"""
+        i, j, disp = self.neighbors(self.alignDist)
+        D = coo_matrix((np.ones(len(i)), (i, j)), shape=(self.N, self.N))
+        nClusters, labels = connected_components(D, directed=False)
+        return nClusters
+
     def buttonPress(self, event):
         """event handler for matplotlib button presses"""
         # left click - add a boid
         if event.button == 1:
-            self.pos = np.concatenate((self.pos, 
-                                       np.array([[event.xdata, event.ydata]])), 
-                                      axis=0)
-            # random velocity
-            angles = 2*math.pi*np.random.rand(1)
-            v = np.array(list(zip(np.sin(angles), np.cos(angles))))
-            self.vel = np.concatenate((self.vel, v), axis=0)
-            self.N += 1 
+            self.spawn([event.xdata, event.ydata])
         # right click - scatter
         elif event.button == 3:
             # add scattering velocity 
@@ -116,6 +359,36 @@ def tick(frameNum, pts, head, boids):
     boids.tick(frameNum, pts, head)
     return pts, head
 
+def setupPlot(fig, size=(width, height)):
+    """add the boids axes to fig and return the (pts, head) artists"""
+    ax = fig.add_subplot(xlim=(0, size[0]), ylim=(0, size[1]))
+    pts, = ax.plot([], [], markersize=10, 
+                   c='k', marker='o', ls='None')
+    head, = ax.plot([], [], markersize=4, 
+                    c='r', marker='o', ls='None')
+    return pts, head
+
+def renderOffscreen(boids, nFrames, frameDir=None):
+    """render nFrames without a display and return frames/second. 
+    frames are written to frameDir as PNG files if it is given."""
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    pts, head = setupPlot(fig, boids.size)
+    ax = pts.axes
+    # draw the static background once, then blit the boids on top
+    canvas.draw()
+    background = canvas.copy_from_bbox(ax.bbox)
+    t0 = time.perf_counter()
+    for i in range(nFrames):
+        boids.tick(i, pts, head)
+        canvas.restore_region(background)
+        ax.draw_artist(pts)
+        ax.draw_artist(head)
+        if frameDir:
+            plt.imsave(os.path.join(frameDir, 'frame{:05d}.png'.format(i)), 
+                       np.asarray(canvas.buffer_rgba()))
+    return nFrames/(time.perf_counter() - t0)
+
 # main() function
 def main():
   # use sys.argv if needed
@@ -123,28 +396,82 @@ def main():
 
   parser = argparse.ArgumentParser(description="Implementing Craig Reynold's Boids...")
   # add arguments
-  parser.add_argument('--num-boids', dest='N', required=False)
+  parser.add_argument('--num-boids', dest='N', required=False,
+                      help="number of boids - large flocks start in a "
+                           "bigger clump, see also --uniform")
+  parser.add_argument('--headless', dest='steps', type=int, required=False,
+                      help="run STEPS time steps without drawing")
+  parser.add_argument('--traj-file', dest='trajFile', required=False,
+                      help="record headless trajectories to this .npy file")
+  parser.add_argument('--frames', dest='nFrames', type=int, required=False,
+                      help="render NFRAMES offscreen and report frames/s")
+  parser.add_argument('--frame-dir', dest='frameDir', required=False,
+                      help="save offscreen frames as PNG files here")
+  parser.add_argument('--box', dest='box', type=float, nargs='+', 
+                      default=[width, height],
+                      help="box size, one value per dimension")
+  parser.add_argument('--periodic', action='store_true', required=False,
+                      help="wrap boids and neighbors around the box")
+  parser.add_argument('--uniform', action='store_true', required=False,
+                      help="start boids spread over the whole box")
+  parser.add_argument('--seed', dest='seed', type=int, required=False)
+  parser.add_argument('--deterministic', action='store_true', required=False,
+                      help="bit-reproducible run, needs --seed")
+  parser.add_argument('--load-state', dest='loadFile', required=False,
+                      help="resume from a checkpoint file")
+  parser.add_argument('--save-state', dest='saveFile', required=False,
+                      help="write a checkpoint file after a headless run")
   args = parser.parse_args()
 
+  if args.deterministic and args.seed is None:
+      parser.error('--deterministic needs --seed')
+
+  # only 2D boids can be drawn
+  if len(args.box) != 2 and not args.steps:
+      parser.error('--box with other than 2 dimensions needs --headless')
+
   # number of boids
   N = 100
   if args.N:
       N = int(args.N)
 
   # create boids
-  boids = Boids(N)
+  if args.loadFile:
+      boids = Boids.load_state(args.loadFile)
+      N = boids.N
+  else:
+      boids = Boids(N, seed=args.seed, size=args.box, periodic=args.periodic, 
+                    uniform=args.uniform, deterministic=args.deterministic)
 
-  # setup plot
-  fig = plt.figure()
-  ax = plt.axes(xlim=(0, width), ylim=(0, height))
+  # run without any rendering
+  if args.steps:
+      traj = None
+      if args.trajFile:
+          traj = boids.newTrajectory(args.steps, args.trajFile)
+      rate = boids.step(args.steps, traj)
+      print('{} steps of {} boids: {:.0f} boid-steps/s'.format(args.steps, 
+                                                               N, rate))
+      if traj is not None:
+          traj.flush()
+      if args.saveFile:
+          boids.save_state(args.saveFile)
+      return
 
-  pts = ax.plot([], [], markersize=10, 
-                  c='k', marker='o', ls='None')
+  # render frames without a display
+  if args.nFrames:
+      if args.frameDir:
+          os.makedirs(args.frameDir, exist_ok=True)
+      fps = renderOffscreen(boids, args.nFrames, args.frameDir)
+      print('{} frames of {} boids: {:.1f} frames/s'.format(args.nFrames, 
+                                                            N, fps))
+      return
 
-  head, = ax.plot([], [], markersize=4, 
-                  c='r', marker='o', ls='None')
-  anim = animation.FuncAnimation(fig, tick, fargs=(pts[0], head, boids), 
-                                 interval=50)
+  # setup plot
+  fig = plt.figure()
+  pts, head = setupPlot(fig, boids.size)
+  # blit only the boids each frame, not the whole figure
+  anim = animation.FuncAnimation(fig, tick, fargs=(pts, head, boids), 
+                                 interval=50, blit=True)
 
   # add a "button press" event handler
   cid = fig.canvas.mpl_connect('button_press_event', boids.buttonPress)
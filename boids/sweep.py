@@ -0,0 +1,91 @@
+"""
+sweep.py
+
+Runs many headless Boids simulations with different parameters
+in a process pool and collects summary statistics for each run.
+
+Author: Mahesh Venkitachalam
+"""
+
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+from multiprocessing import Pool
+
+from boids import Boids
+
+# one row of the results table
+resultType = np.dtype([('minDist', np.float32),
+                       ('maxRuleVel', np.float32),
+                       ('alignDist', np.float32),
+                       ('seed', np.int32),
+                       ('order', np.float32),
+                       ('clusters', np.int32),
+                       ('rate', np.float32)])
+
+def runSim(params):
+    """run one headless simulation and return its row of results"""
+    minDist, maxRuleVel, alignDist, seed, N, steps = params
+    boids = Boids(N, seed)
+    boids.minDist = minDist
+    boids.maxRuleVel = maxRuleVel
+    boids.alignDist = alignDist
+    boids.step(steps)
+    return (minDist, maxRuleVel, alignDist, seed,
+            boids.orderParameter(), boids.clusterCount(), boids.stepRate)
+
+def sweep(minDists, maxRuleVels, alignDists, seeds, N, steps,
+          nProcs=None):
+    """run all parameter combinations in a process pool and
+    return the results as a structured array"""
+    jobs = [(m, v, a, s, N, steps) for (m, v, a, s) in
+            itertools.product(minDists, maxRuleVels, alignDists, seeds)]
+    with Pool(nProcs) as pool:
+        # small chunks keep all workers busy till the end
+        rows = pool.map(runSim, jobs, chunksize=1)
+    return np.array(rows, dtype=resultType)
+
+def saveResults(results, fileName):
+    """write results as CSV if fileName ends in .csv, else as .npy"""
+    if fileName.endswith('.csv'):
+        np.savetxt(fileName, results, delimiter=',',
+                   header=','.join(results.dtype.names), comments='',
+                   fmt=['%g', '%g', '%g', '%d', '%.4f', '%d', '%.0f'])
+    else:
+        np.save(fileName, results)
+
+# main() function
+def main():
+  parser = argparse.ArgumentParser(description="Runs a Boids parameter sweep.")
+  # add arguments
+  parser.add_argument('--num-boids', dest='N', type=int, default=100)
+  parser.add_argument('--steps', dest='steps', type=int, default=500)
+  parser.add_argument('--min-dist', dest='minDists', type=float, nargs='+',
+                      default=[25.0])
+  parser.add_argument('--max-rule-vel', dest='maxRuleVels', type=float,
+                      nargs='+', default=[0.03])
+  parser.add_argument('--align-dist', dest='alignDists', type=float,
+                      nargs='+', default=[50.0])
+  parser.add_argument('--seeds', dest='nSeeds', type=int, default=4,
+                      help="number of random seeds per parameter set")
+  parser.add_argument('--procs', dest='nProcs', type=int, default=None,
+                      help="worker processes (default: all cores)")
+  parser.add_argument('--out', dest='outFile', default='sweep.npy')
+  args = parser.parse_args()
+
+  nProcs = args.nProcs or os.cpu_count()
+  print('running sweep on {} processes...'.format(nProcs))
+  t0 = time.perf_counter()
+  results = sweep(args.minDists, args.maxRuleVels, args.alignDists,
+                  range(args.nSeeds), args.N, args.steps, nProcs)
+  elapsed = time.perf_counter() - t0
+  saveResults(results, args.outFile)
+  print('{} runs in {:.1f}s, results written to {}'.format(len(results),
+                                                          elapsed,
+                                                          args.outFile))
+
+# call main
+if __name__ == '__main__':
+  main()
@@ -1,53 +1,94 @@
-"""
-boids
-
-Loops vs. Numpy
-
-Author: Mahesh Venkitachalam
-"""
-
-import math 
-import numpy as np
-from scipy.spatial.distance import squareform, pdist
-from timeit import timeit
-
-N = 100
-width, height = 640, 480
-pos = np.array(list(zip(width*np.random.rand(N), height*np.random.rand(N))))
-
-def test1(pos, radius):
-    # fill output with zeros
-    vel = np.zeros(2*N).reshape(N, 2)
-    # for each pos
-    for (i1, p1) in enumerate(pos):
-        # velocity contribution
-        val = np.array([0.0, 0.0])
-        # for each other pos
-        for (i2, p2) in enumerate(pos):
-            if i1 != i2:
-                # calculate distance from p1
-                dist = math.sqrt((p2[0]-p1[0])*(p2[0]-p1[0]) + 
-                                 (p2[1]-p1[1])*(p2[1]-p1[1]))
-                # apply threshold
-                if dist < radius:
-                    val += (p2 - p1)
-        # set velocity
-        vel[i1] = val
-    # return computed velocity
-    return vel
-
-def test2(pos, radius):
-    # get distance matrix
-    distMatrix = squareform(pdist(pos))
-    # apply threshold
-    D = distMatrix < radius
-    # compute velocity
-    vel = pos*D.sum(axis=1).reshape(N, 1) - D.dot(pos)
-    return vel
-
-def main():    
-    print(timeit('test1(pos, 100)', 'from test import test1, N, pos, width, height', number=100))
-    print(timeit('test2(pos, 100)', 'from test import test2, N, pos, width, height', number=100))
-
-if __name__ == '__main__':
+"""
+boids
+
+Loops vs. Numpy
+
+Author: Mahesh Venkitachalam
+"""
+
+import math 
+import numpy as np
+from scipy.spatial.distance import squareform, pdist
+from timeit import timeit
+
+from boids import Boids
+
+N = 100
+width, height = 640, 480
+pos = np.array(list(zip(width*np.random.rand(N), height*np.random.rand(N))))
+# velocities of up to 1 and positions a little past the edges, so that
+# limiting and wrapping both have work to do
+vel = np.random.rand(2*N).reshape(N, 2)
+edgePos = np.array(list(zip((width + 20)*np.random.rand(N) - 10,
+                            (height + 20)*np.random.rand(N) - 10)))
+boids = Boids(N, size=(width, height))
+
+def test1(pos, radius):
+    # fill output with zeros
+    vel = np.zeros(2*N).reshape(N, 2)
+    # for each pos
+    for (i1, p1) in enumerate(pos):
+        # velocity contribution
+        val = np.array([0.0, 0.0])
+        # for each other pos
+        for (i2, p2) in enumerate(pos):
+            if i1 != i2:
+                # calculate distance from p1
+                dist = math.sqrt((p2[0]-p1[0])*(p2[0]-p1[0]) + 
+                                 (p2[1]-p1[1])*(p2[1]-p1[1]))
+                # apply threshold
+                if dist < radius:
+                    val += (p2 - p1)
+        # set velocity
+        vel[i1] = val
+    # return computed velocity
+    return vel
+
+def test2(pos, radius):
+    # get distance matrix
+    distMatrix = squareform(pdist(pos))
+    # apply threshold
+    D = distMatrix < radius
+    # compute velocity
+    vel = pos*D.sum(axis=1).reshape(N, 1) - D.dot(pos)
+    return vel
+
+def test3(pos, vel, maxVal):
+    # work on fresh copies so that every run does the same work
+    pos, vel = pos.copy(), vel.copy()
+    # limit each vector in turn, as Boids.limit() used to
+    for vec in vel:
+        mag = math.sqrt(vec[0]*vec[0] + vec[1]*vec[1])
+        if mag > maxVal:
+            vec[0], vec[1] = vec[0]*maxVal/mag, vec[1]*maxVal/mag
+    # wrap each coordinate in turn, as Boids.applyBC() used to
+    deltaR = 2.0
+    for coord in pos:
+        if coord[0] > width + deltaR:
+            coord[0] = - deltaR
+        if coord[0] < - deltaR:
+            coord[0] = width + deltaR
+        if coord[1] > height + deltaR:
+            coord[1] = - deltaR
+        if coord[1] < - deltaR:
+            coord[1] = height + deltaR
+    return pos, vel
+
+def test4(pos, vel, maxVal):
+    # work on fresh copies so that every run does the same work
+    np.copyto(boids.pos, pos)
+    vel = vel.copy()
+    # the vectorized Boids methods
+    boids.limit(vel, maxVal)
+    boids.applyBC()
+    return boids.pos, vel
+
+def main():    
+    print(timeit('test1(pos, 100)', 'from test import test1, N, pos, width, height', number=100))
+    print(timeit('test2(pos, 100)', 'from test import test2, N, pos, width, height', number=100))
+    # limit + boundary conditions
+    print(timeit('test3(edgePos, vel, 0.5)', 'from test import test3, edgePos, vel', number=1000))
+    print(timeit('test4(edgePos, vel, 0.5)', 'from test import test4, edgePos, vel', number=1000))
+
+if __name__ == '__main__':
     main()
\ No newline at end of file
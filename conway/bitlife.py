@@ -0,0 +1,110 @@
+"""
+bitlife.py
+
+A bit-packed Game of Life engine: each row of the grid is stored
+as 64 cells per uint64 word, and all 64 cells of a word are updated
+together with bitwise adder logic.
+
+Author: Mahesh Venkitachalam
+"""
+
+import numpy as np
+
+from rules import isConway, parseRule
+
+def packGrid(grid):
+    """returns a 0/1 grid of shape (NX, NY) packed into an
+    (NX, ceil(NY/64)) uint64 array - bit k of word m is column 64*m + k"""
+    NX, NY = grid.shape
+    nWords = (NY + 63)//64
+    padded = np.zeros((NX, 64*nWords), np.uint8)
+    padded[:, :NY] = grid
+    # 8 cells per byte, then 8 little-endian bytes per word
+    bytes8 = np.packbits(padded, axis=1, bitorder='little')
+    return bytes8.view('<u8').astype(np.uint64)
+
+def unpackGrid(words, NY):
+    """returns the 0/1 uint8 grid of width NY packed in words"""
+    bytes8 = words.astype('<u8').view(np.uint8)
+    return np.unpackbits(bytes8, axis=1, bitorder='little')[:, :NY]
+
+def fullAdd(a, b, c):
+    """bitwise full adder - returns (sum, carry) words"""
+    t = a ^ b
+    return t ^ c, (a & b) | (t & c)
+
+class BitLife:
+    """Game of Life on a toroidal grid packed 64 cells per word"""
+    def __init__(self, grid, rule=None):
+        """initialize from a 0/1 grid and an optional B/S rule"""
+        self.NX, self.NY = grid.shape
+        self.words = packGrid(grid)
+        # bit position of the last column in the last word of a row
+        self.last = np.uint64((self.NY - 1) % 64)
+        # valid bits of the last word - the rest is padding
+        self.mask = np.uint64((1 << (int(self.last) + 1)) - 1)
+        # block sums (cell included) that give a live cell, for dead
+        # and live cells - None for the Conway fast path
+        self.sums = None
+        if not isConway(rule):
+            birth, survive = parseRule(rule)
+            self.sums = (sorted(birth), sorted(n + 1 for n in survive))
+
+    def shiftWest(self, w):
+        """returns words where each cell holds its west neighbor"""
+        W = (w << np.uint64(1)) | (np.roll(w, 1, axis=1) >> np.uint64(63))
+        # first column wraps around to the last column
+        W[:, 0] = (w[:, 0] << np.uint64(1)) | ((w[:, -1] >> self.last) &
+                                               np.uint64(1))
+        return W
+
+    def shiftEast(self, w):
+        """returns words where each cell holds its east neighbor"""
+        E = (w >> np.uint64(1)) | (np.roll(w, -1, axis=1) << np.uint64(63))
+        # last column wraps around to the first column
+        E[:, -1] = (w[:, -1] >> np.uint64(1)) | ((w[:, 0] & np.uint64(1)) <<
+                                                 self.last)
+        return E
+
+    def step(self, n=1):
+        """advance the simulation by n generations"""
+        for i in range(n):
+            w = self.words
+            # sum of each cell and its west/east neighbors: h0 + 2*h1
+            (h0, h1) = fullAdd(self.shiftWest(w), w, self.shiftEast(w))
+            # add the row sums above and below, wrapping around, to get the
+            # 3x3 block sum mod 8: t0 + 2*t1 + 4*t2
+            (t0, c) = fullAdd(np.roll(h0, 1, axis=0), h0,
+                              np.roll(h0, -1, axis=0))
+            (u0, u1) = fullAdd(np.roll(h1, 1, axis=0), h1,
+                               np.roll(h1, -1, axis=0))
+            t1 = u0 ^ c
+            t2 = u1 ^ (u0 & c)
+            if self.sums is None:
+                # Conway's rules as in rules.nextGen(), on bit planes:
+                # sum 3, or sum 4 and alive (8 and 9 wrap to 0 and 1
+                # and die)
+                self.words = (t0 & t1 & ~t2) | (w & ~t0 & ~t1 & t2)
+            else:
+                # full block sum 0-9 needs the fourth bit
+                t3 = u1 & u0 & c
+                self.words = self.applyRule(w, (t0, t1, t2, t3))
+            # keep padding bits clear
+            self.words[:, -1] &= self.mask
+
+    def applyRule(self, w, bits):
+        """returns the next generation for a general rule, given the
+        current words and the bit planes of the block sums"""
+        out = np.zeros_like(w)
+        for (cells, sums) in zip((~w, w), self.sums):
+            for total in sums:
+                # cells whose block sum equals total
+                match = cells.copy()
+                for (b, plane) in enumerate(bits):
+                    match &= plane if (total >> b) & 1 else ~plane
+                out |= match
+        return out
+
+    def getGrid(self):
+        """returns the current grid as a 0/1 uint8 array"""
+        return unpackGrid(self.words, self.NY)
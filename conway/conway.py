@@ -7,76 +7,154 @@ Author: Mahesh Venkitachalam
 """
 
 import sys, argparse
+import time
 import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.animation as animation
 
+from bitlife import BitLife
+from hashlife import HashLife
+from sparselife import SparseLife
+from parlife import ParLife
+from patterns import loadPattern, stampPatterns
+from rules import parseRule, ruleTable, isConway, namedRules, blockSum, nextGen
+
 def randomGrid(N):
-    """returns a grid of NxN random values"""
-    return np.random.choice([255, 0], N*N, p=[0.2, 0.8]).reshape(N, N)
+    """returns a grid of NxN random 0/1 values"""
+    return np.random.choice(np.array([1, 0], np.uint8), N*N, 
+                            p=[0.2, 0.8]).reshape(N, N)
 
 def addGlider(i, j, grid):
     """adds a glider with top left cell at (i, j)"""
-    glider = np.array([[0,    0, 255], 
-                       [255,  0, 255], 
-                       [0,  255, 255]])
+    glider = np.array([[0,  0, 1], 
+                       [1,  0, 1], 
+                       [0,  1, 1]], np.uint8)
     grid[i:i+3, j:j+3] = glider
 
 def addGosperGliderGun(i, j, grid):
     """adds a Gosper Glider Gun with top left cell at (i, j)"""
-    gun = np.zeros(11*38).reshape(11, 38)
-
-    gun[5][1] = gun[5][2] = 255
-    gun[6][1] = gun[6][2] = 255
-
-    gun[3][13] = gun[3][14] = 255
-    gun[4][12] = gun[4][16] = 255
-    gun[5][11] = gun[5][17] = 255
-    gun[6][11] = gun[6][15] = gun[6][17] = gun[6][18] = 255
-    gun[7][11] = gun[7][17] = 255
-    gun[8][12] = gun[8][16] = 255
-    gun[9][13] = gun[9][14] = 255
-
-    gun[1][25] = 255
-    gun[2][23] = gun[2][25] = 255
-    gun[3][21] = gun[3][22] = 255
-    gun[4][21] = gun[4][22] = 255
-    gun[5][21] = gun[5][22] = 255
-    gun[6][23] = gun[6][25] = 255
-    gun[7][25] = 255
-
-    gun[3][35] = gun[3][36] = 255
-    gun[4][35] = gun[4][36] = 255
+    gun = np.zeros(11*38, np.uint8).reshape(11, 38)
+
+    gun[5][1] = gun[5][2] = 1
+    gun[6][1] = gun[6][2] = 1
+
+    gun[3][13] = gun[3][14] = 1
+    gun[4][12] = gun[4][16] = 1
+    gun[5][11] = gun[5][17] = 1
+    gun[6][11] = gun[6][15] = gun[6][17] = gun[6][18] = 1
+    gun[7][11] = gun[7][17] = 1
+    gun[8][12] = gun[8][16] = 1
+    gun[9][13] = gun[9][14] = 1
+
+    gun[1][25] = 1
+    gun[2][23] = gun[2][25] = 1
+    gun[3][21] = gun[3][22] = 1
+    gun[4][21] = gun[4][22] = 1
+    gun[5][21] = gun[5][22] = 1
+    gun[6][23] = gun[6][25] = 1
+    gun[7][25] = 1
+
+    gun[3][35] = gun[3][36] = 1
+    gun[4][35] = gun[4][36] = 1
 
     grid[i:i+11, j:j+38] = gun
 
-def update(frameNum, img, grid, N):
+def lifeStepLoop(grid, table=None):
+    """returns the next generation of a 0/1 grid, one cell at a time, 
+    using Conway's rules or a rule table from rules.ruleTable()"""
+    NX, NY = grid.shape
     # copy grid since we require 8 neighbors for calculation
     # and we go line by line 
     newGrid = grid.copy()
-    for i in range(N):
-        for j in range(N):
+    for i in range(NX):
+        for j in range(NY):
             # compute 8-neghbor sum
             # using toroidal boundary conditions - x and y wrap around 
             # so that the simulaton takes place on a toroidal surface.
-            total = int((grid[i, (j-1)%N] + grid[i, (j+1)%N] + 
-                         grid[(i-1)%N, j] + grid[(i+1)%N, j] + 
-                         grid[(i-1)%N, (j-1)%N] + grid[(i-1)%N, (j+1)%N] + 
-                         grid[(i+1)%N, (j-1)%N] + grid[(i+1)%N, (j+1)%N])/255)
+            total = int(grid[i, (j-1)%NY]) + int(grid[i, (j+1)%NY]) + \
+                    int(grid[(i-1)%NX, j]) + int(grid[(i+1)%NX, j]) + \
+                    int(grid[(i-1)%NX, (j-1)%NY]) + int(grid[(i-1)%NX, (j+1)%NY]) + \
+                    int(grid[(i+1)%NX, (j-1)%NY]) + int(grid[(i+1)%NX, (j+1)%NY])
+            # apply rule table
+            if table is not None:
+                newGrid[i, j] = table[grid[i, j], total]
             # apply Conway's rules
-            if grid[i, j]  == 255:
+            elif grid[i, j]  == 1:
                 if (total < 2) or (total > 3):
                     newGrid[i, j] = 0
             else:
                 if total == 3:
-                    newGrid[i, j] = 255
-    # update data
-    img.set_data(newGrid)
-    grid[:] = newGrid[:]
+                    newGrid[i, j] = 1
+    return newGrid
+
+def lifeStep(grid, table=None):
+    """returns the next generation of a 0/1 uint8 grid, computed on 
+    the whole grid at once, using Conway's rules or a rule table 
+    from rules.ruleTable()"""
+    return nextGen(grid, blockSum(grid), table)
+
+class GridLife:
+    """life engine that keeps a plain 0/1 grid and steps it with 
+    a grid -> grid function such as lifeStep()"""
+    def __init__(self, grid, rule=None, stepFunc=lifeStep):
+        self.grid = grid
+        self.stepFunc = stepFunc
+        # Conway's rules have their own fast path
+        self.table = None if isConway(rule) else ruleTable(rule)
+
+    def step(self, n=1):
+        """advance the simulation by n generations"""
+        for i in range(n):
+            self.grid = self.stepFunc(self.grid, self.table)
+
+    def getGrid(self):
+        """returns the current grid as a 0/1 uint8 array"""
+        return self.grid
+
+# life engines that can be selected with --engine: each one is created 
+# from a 0/1 grid and an optional rule, and provides step() and getGrid()
+engines = {
+    'numpy': GridLife,
+    'loop': lambda grid, rule=None: GridLife(grid, rule, lifeStepLoop),
+    'bitpacked': BitLife,
+    'sparse': SparseLife,
+    'parallel': ParLife,
+    # unbounded plane, not a torus - see hashlife.py
+    'hashlife': HashLife,
+}
+
+def update(frameNum, img, grid, N, life):
+    # compute next generation
+    life.step()
+    grid[:] = life.getGrid()
+    # update data - scaled to 0/255 only for display
+    img.set_data(255*grid)
     # need to return a tuple here, since this callback 
     # function needs to return an interable.
     return img,
 
+def runHeadless(grid, engine, nGens, snapEvery=0, rule=None):
+    """run nGens generations of the named engine without display.
+    returns (cells/second, generations, snapshots), where snapshots are
+    bit-packed grids taken every snapEvery generations."""
+    life = engines[engine](grid.copy(), rule)
+    gens, snaps = [], []
+    done, elapsed = 0, 0.0
+    while done < nGens:
+        n = min(snapEvery or nGens, nGens - done)
+        t0 = time.perf_counter()
+        life.step(n)
+        elapsed += time.perf_counter() - t0
+        done += n
+        if snapEvery:
+            gens.append(done)
+            snaps.append(np.packbits(life.getGrid(), axis=-1))
+    # engines holding workers or shared memory need to be shut down
+    if hasattr(life, 'close'):
+        life.close()
+    rate = grid.size*nGens/elapsed if elapsed > 0 else float('inf')
+    return rate, gens, snaps
+
 # main() function
 def main():
     # Command line args are in sys.argv[1], sys.argv[2] ..
@@ -88,10 +166,50 @@ def main():
     parser.add_argument('--interval', dest='interval', required=False)
     parser.add_argument('--glider', action='store_true', required=False)
     parser.add_argument('--gosper', action='store_true', required=False)
+    parser.add_argument('--pattern', dest='pattern', required=False,
+                        help="pattern file (.rle, .lif, .life or .cells) "
+                             "placed at the centre of the grid")
+    parser.add_argument('--pattern-cache', dest='patternCache', 
+                        required=False,
+                        help="folder for cached parsed patterns")
+    parser.add_argument('--engine', choices=list(engines) + ['all'], 
+                        default='numpy', required=False,
+                        help="'all' runs every engine but 'loop' (headless)")
+    parser.add_argument('--headless', dest='nGens', type=int, required=False,
+                        help="run NGENS generations without display and "
+                             "report cells/second")
+    parser.add_argument('--snapshot-every', dest='snapEvery', type=int, 
+                        default=0, required=False)
+    parser.add_argument('--snapshot-file', dest='snapFile', required=False,
+                        help="compressed .npz file for bit-packed snapshots")
+    parser.add_argument('--rule', dest='rule', default='B3/S23', 
+                        required=False,
+                        help="rule in B/S notation or one of: " + 
+                             ', '.join(namedRules))
     args = parser.parse_args()
+    try:
+        parseRule(args.rule)
+    except ValueError as e:
+        parser.error(str(e))
     
     # set grid size
     N = 100
+    # set N if specified and valid
+    if args.N and int(args.N) > 8:
+        N = int(args.N)
+    if args.gosper and N < 50:
+        parser.error('the Gosper gun needs --grid-size of at least 50')
+    pattern = None
+    if args.pattern:
+        try:
+            pattern = loadPattern(args.pattern, args.patternCache)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if max(pattern.shape) > N:
+            parser.error('the pattern needs --grid-size of at least {}'
+                         .format(max(pattern.shape)))
+    if args.engine == 'all' and not args.nGens:
+        parser.error('--engine all needs --headless')
         
     # set animation update interval
     updateInterval = 50
@@ -102,26 +220,55 @@ def main():
     grid = np.array([])
     # check if "glider" demo flag is specified
     if args.glider:
-        grid = np.zeros(N*N).reshape(N, N)
+        grid = np.zeros(N*N, np.uint8).reshape(N, N)
         addGlider(1, 1, grid)
     elif args.gosper:
-        grid = np.zeros(N*N).reshape(N, N)
+        grid = np.zeros(N*N, np.uint8).reshape(N, N)
         addGosperGliderGun(10, 10, grid)
+    elif pattern is not None:
+        grid = np.zeros(N*N, np.uint8).reshape(N, N)
+        stampPatterns(grid, pattern, [((N - pattern.shape[0])//2, 
+                                       (N - pattern.shape[1])//2)])
     else: 
-        # set N if specified and valid
-        if args.N and int(args.N) > 8:
-            N = int(args.N)
         # populate grid with random on/off - more off than on
         grid = randomGrid(N)
 
+    # run without display
+    if args.nGens:
+        names = [args.engine]
+        if args.engine == 'all':
+            names = [name for name in engines if name != 'loop']
+        results = {}
+        for name in names:
+            try:
+                rate, gens, snaps = runHeadless(grid, name, args.nGens, 
+                                                args.snapEvery, args.rule)
+            except ValueError as e:
+                # some engines can't run every rule
+                print('{:>10}: skipped - {}'.format(name, e))
+                continue
+            print('{:>10}: {} generations of {}x{}: {:.3g} cells/s'.format(
+                name, args.nGens, N, N, rate))
+            if snaps:
+                results[name] = np.stack(snaps)
+        if args.snapFile and results:
+            np.savez_compressed(args.snapFile, shape=grid.shape, 
+                                generations=gens, **results)
+        return
+
     # set up animation
+    life = engines[args.engine](grid.copy(), args.rule)
     fig, ax = plt.subplots()
-    img = ax.imshow(grid, interpolation='nearest')
-    ani = animation.FuncAnimation(fig, update, fargs=(img, grid, N, ),
+    img = ax.imshow(255*grid, interpolation='nearest')
+    ani = animation.FuncAnimation(fig, update, 
+                                  fargs=(img, grid, N, life),
                                   frames = 10,
                                   interval=updateInterval)
 
     plt.show()
+    # shut down workers and shared memory once the window is closed
+    if hasattr(life, 'close'):
+        life.close()
 
 # call main
 if __name__ == '__main__':
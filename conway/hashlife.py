@@ -0,0 +1,259 @@
+"""
+hashlife.py
+
+A Hashlife engine for Conway's Game of Life, or any life-like rule
+without B0 (see rules.py). The board is a quadtree of canonical
+(hash-consed) nodes, and the future of every node is memoized, so
+regular patterns like the Gosper glider gun can be jumped forward 2^k
+generations at a time.
+
+Unlike the other engines, Hashlife runs on an unbounded plane, not on
+a torus: getGrid() shows the original window of the grid, and cells
+that leave it are not wrapped around.
+
+Author: Mahesh Venkitachalam
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+from rules import parseRule
+
+class Node:
+    """quadtree node covering 2^k x 2^k cells, with quadrants
+    a (top left), b (top right), c (bottom left) and d (bottom right).
+    n is the number of live cells."""
+    __slots__ = ('k', 'a', 'b', 'c', 'd', 'n')
+
+    def __init__(self, k, a, b, c, d, n):
+        self.k = k
+        self.a, self.b, self.c, self.d = a, b, c, d
+        self.n = n
+
+class HashLife:
+    """Hashlife engine - nodes are canonical, so they can be compared
+    and hashed by identity"""
+    def __init__(self, grid=None, rule=None, cacheSize=1 << 20,
+                 maxNodes=1 << 22):
+        """initialize from an optional 0/1 grid and B/S rule. cacheSize
+        bounds the result cache (least recently used results are evicted)
+        and maxNodes triggers a collection of unused nodes. rules where
+        empty space comes alive (B0) can't be run on an unbounded plane."""
+        self.birth, self.survive = parseRule(rule or 'B3/S23')
+        if 0 in self.birth:
+            raise ValueError('B0 rules are not supported by Hashlife')
+        self.cacheSize = cacheSize
+        self.maxNodes = maxNodes
+        # level 0 nodes are single cells
+        self.off = Node(0, None, None, None, None, 0)
+        self.on = Node(0, None, None, None, None, 1)
+        self.clear()
+        self.root = self.zero(3)
+        # world coordinates of grid cell (0, 0), and window shape
+        self.origin = (-4, -4)
+        self.shape = (8, 8)
+        # generations computed so far
+        self.generation = 0
+        if grid is not None:
+            self.setGrid(grid)
+
+    def clear(self):
+        """empty the hash-consing table and all caches"""
+        # (a, b, c, d) -> node
+        self.nodes = {}
+        # (node, j) -> node advanced 2^j generations, in LRU order
+        self.results = OrderedDict()
+        # empty node of each level
+        self.zeros = [self.off]
+        # node -> 0/1 array, for small nodes
+        self.blocks = {}
+
+    def join(self, a, b, c, d):
+        """returns the canonical node with quadrants a, b, c, d"""
+        key = (a, b, c, d)
+        node = self.nodes.get(key)
+        if node is None:
+            node = Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+            self.nodes[key] = node
+        return node
+
+    def zero(self, k):
+        """returns the empty node of level k"""
+        while len(self.zeros) <= k:
+            z = self.zeros[-1]
+            self.zeros.append(self.join(z, z, z, z))
+        return self.zeros[k]
+
+    def centre(self, m):
+        """returns a node one level up with m at its centre"""
+        z = self.zero(m.k - 1)
+        return self.join(self.join(z, z, z, m.a), self.join(z, z, m.b, z),
+                         self.join(z, m.c, z, z), self.join(m.d, z, z, z))
+
+    def inner(self, m):
+        """returns the centre quadrant of m, one level down"""
+        return self.join(m.a.d, m.b.c, m.c.b, m.d.a)
+
+    def life4x4(self, m):
+        """returns the centre 2x2 cells of a level 2 node after one
+        generation"""
+        cells = [[m.a.a.n, m.a.b.n, m.b.a.n, m.b.b.n],
+                 [m.a.c.n, m.a.d.n, m.b.c.n, m.b.d.n],
+                 [m.c.a.n, m.c.b.n, m.d.a.n, m.d.b.n],
+                 [m.c.c.n, m.c.d.n, m.d.c.n, m.d.d.n]]
+        out = []
+        for i in (1, 2):
+            for j in (1, 2):
+                total = (sum(cells[i-1][j-1:j+2]) + sum(cells[i+1][j-1:j+2]) +
+                         cells[i][j-1] + cells[i][j+1])
+                # apply the rule
+                alive = total in (self.survive if cells[i][j] else self.birth)
+                out.append(self.on if alive else self.off)
+        return self.join(*out)
+
+    def successor(self, m, j):
+        """returns the centre of m (one level down) advanced
+        2^j generations, where j <= m.k - 2"""
+        if m.n == 0:
+            return m.a
+        key = (m, j)
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            return result
+        if m.k == 2:
+            result = self.life4x4(m)
+        else:
+            join, succ = self.join, self.successor
+            jj = min(j, m.k - 3)
+            # nine overlapping sub-squares, each advanced 2^jj generations
+            c1 = succ(join(m.a.a, m.a.b, m.a.c, m.a.d), jj)
+            c2 = succ(join(m.a.b, m.b.a, m.a.d, m.b.c), jj)
+            c3 = succ(join(m.b.a, m.b.b, m.b.c, m.b.d), jj)
+            c4 = succ(join(m.a.c, m.a.d, m.c.a, m.c.b), jj)
+            c5 = succ(join(m.a.d, m.b.c, m.c.b, m.d.a), jj)
+            c6 = succ(join(m.b.c, m.b.d, m.d.a, m.d.b), jj)
+            c7 = succ(join(m.c.a, m.c.b, m.c.c, m.c.d), jj)
+            c8 = succ(join(m.c.b, m.d.a, m.c.d, m.d.c), jj)
+            c9 = succ(join(m.d.a, m.d.b, m.d.c, m.d.d), jj)
+            if j < m.k - 2:
+                # already far enough - just take the centres
+                result = join(join(c1.d, c2.c, c4.b, c5.a),
+                              join(c2.d, c3.c, c5.b, c6.a),
+                              join(c4.d, c5.c, c7.b, c8.a),
+                              join(c5.d, c6.c, c8.b, c9.a))
+            else:
+                # advance the four combined quadrants another 2^jj
+                result = join(succ(join(c1, c2, c4, c5), jj),
+                              succ(join(c2, c3, c5, c6), jj),
+                              succ(join(c4, c5, c7, c8), jj),
+                              succ(join(c5, c6, c8, c9), jj))
+        self.results[key] = result
+        if len(self.results) > self.cacheSize:
+            self.results.popitem(last=False)
+        return result
+
+    def jump(self, k):
+        """advance the simulation by 2^k generations"""
+        node = self.root
+        while node.k < k + 2:
+            node = self.centre(node)
+        # pad twice so nothing can grow out of the result
+        node = self.centre(self.centre(node))
+        node = self.successor(node, k)
+        # drop empty borders
+        while node.k > 3 and self.inner(node).n == node.n:
+            node = self.inner(node)
+        self.root = node
+        self.generation += 1 << k
+        if len(self.nodes) > self.maxNodes:
+            self.collect()
+
+    def step(self, n=1):
+        """advance the simulation by n generations"""
+        k = 0
+        while n:
+            if n & 1:
+                self.jump(k)
+            n >>= 1
+            k += 1
+
+    def collect(self):
+        """drop all nodes that are not part of the current board"""
+        live = []
+        stack = [self.root]
+        seen = set()
+        while stack:
+            m = stack.pop()
+            if m.k == 0 or m in seen:
+                continue
+            seen.add(m)
+            live.append(m)
+            stack.extend((m.a, m.b, m.c, m.d))
+        self.clear()
+        for m in live:
+            self.nodes[(m.a, m.b, m.c, m.d)] = m
+        self.zero(self.root.k)
+
+    def setGrid(self, grid):
+        """set the board from a 0/1 grid"""
+        NX, NY = grid.shape
+        k = max(3, int(np.ceil(np.log2(max(NX, NY)))))
+        size = 1 << k
+        ids = np.zeros((size, size), np.int64)
+        ids[:NX, :NY] = grid
+        # build the tree bottom up, one level at a time, creating
+        # a Python node only once for each distinct quadruple
+        table = [self.off, self.on]
+        while len(ids) > 1:
+            quads = np.stack((ids[0::2, 0::2], ids[0::2, 1::2],
+                              ids[1::2, 0::2], ids[1::2, 1::2]), axis=-1)
+            keys, inverse = np.unique(quads.reshape(-1, 4), axis=0,
+                                      return_inverse=True)
+            table = [self.join(table[a], table[b], table[c], table[d])
+                     for (a, b, c, d) in keys.tolist()]
+            ids = inverse.reshape(quads.shape[:2])
+        self.root = table[ids[0, 0]]
+        self.origin = (-size//2, -size//2)
+        self.shape = (NX, NY)
+        self.generation = 0
+
+    def block(self, m):
+        """returns the cells of a small node as a 0/1 array"""
+        arr = self.blocks.get(m)
+        if arr is None:
+            if m.k == 0:
+                arr = np.array([[m.n]], np.uint8)
+            else:
+                arr = np.block([[self.block(m.a), self.block(m.b)],
+                                [self.block(m.c), self.block(m.d)]])
+            self.blocks[m] = arr
+        return arr
+
+    def paint(self, m, top, left, out, r0, c0):
+        """draw node m, whose top left cell is at world (top, left),
+        into out, whose cell (0, 0) is at world (r0, c0)"""
+        size = 1 << m.k
+        # skip empty nodes and nodes outside the window
+        i0, j0 = top - r0, left - c0
+        if (m.n == 0 or i0 >= out.shape[0] or j0 >= out.shape[1] or
+                i0 + size <= 0 or j0 + size <= 0):
+            return
+        if m.k <= 4:
+            arr = self.block(m)
+            a, b = max(0, -i0), max(0, -j0)
+            sub = arr[a:out.shape[0] - i0, b:out.shape[1] - j0]
+            out[i0 + a:i0 + a + sub.shape[0], j0 + b:j0 + b + sub.shape[1]] = sub
+            return
+        h = size//2
+        self.paint(m.a, top, left, out, r0, c0)
+        self.paint(m.b, top, left + h, out, r0, c0)
+        self.paint(m.c, top + h, left, out, r0, c0)
+        self.paint(m.d, top + h, left + h, out, r0, c0)
+
+    def getGrid(self):
+        """returns the window of the original grid as a 0/1 uint8 array"""
+        out = np.zeros(self.shape, np.uint8)
+        half = (1 << self.root.k)//2
+        self.paint(self.root, -half, -half, out, *self.origin)
+        return out
@@ -0,0 +1,92 @@
+"""
+parlife.py
+
+A multi-core Game of Life engine for very large toroidal grids. The
+grid is double-buffered in shared memory and split into horizontal
+bands, and a pool of worker processes updates the bands in parallel,
+one generation at a time.
+
+Author: Mahesh Venkitachalam
+"""
+
+import os
+import numpy as np
+from multiprocessing import Pool, shared_memory
+
+from rules import isConway, ruleTable, nextGen
+
+# worker side: the two shared grids, attached once by initWorker()
+workerGrids = []
+
+def initWorker(names, shape):
+    """attach a pool worker to the shared grid buffers"""
+    for name in names:
+        shm = shared_memory.SharedMemory(name=name)
+        workerGrids.append((shm, np.ndarray(shape, np.uint8, shm.buf)))
+
+def stepBand(task):
+    """compute rows r0 to r1 of grid dst from grid src, using
+    Conway's rules or a rule table"""
+    src, dst, r0, r1, table = task
+    grid = workerGrids[src][1]
+    out = workerGrids[dst][1]
+    NX = grid.shape[0]
+    # the band plus one halo row above and below, wrapping around - the
+    # halo rows are the edge rows of the neighboring bands from the
+    # previous generation, read straight from shared memory
+    rows = np.arange(r0 - 1, r1 + 1) % NX
+    ext = grid[rows]
+    # toroidal 3x3 block sums
+    cols = ext[:-2] + ext[1:-1] + ext[2:]
+    total = cols + np.roll(cols, 1, axis=1)
+    total += np.roll(cols, -1, axis=1)
+    out[r0:r1] = nextGen(ext[1:-1], total, table)
+
+class ParLife:
+    """Game of Life on a toroidal grid, updated in parallel bands by
+    a process pool"""
+    def __init__(self, grid, rule=None, nProcs=None, nBands=None):
+        """initialize from a 0/1 grid and an optional B/S rule, with
+        nProcs workers (default: all cores) and nBands bands (default:
+        2 per worker)"""
+        self.table = None if isConway(rule) else ruleTable(rule)
+        NX, NY = grid.shape
+        nProcs = nProcs or os.cpu_count()
+        nBands = min(nBands or 2*nProcs, NX)
+        # two grids in shared memory - read one, write the other
+        self.shms = [shared_memory.SharedMemory(create=True, size=NX*NY)
+                     for i in range(2)]
+        self.grids = [np.ndarray((NX, NY), np.uint8, shm.buf)
+                      for shm in self.shms]
+        self.grids[0][:] = grid
+        self.cur = 0
+        # band boundaries
+        edges = np.linspace(0, NX, nBands + 1).astype(int)
+        self.bands = list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+        self.pool = Pool(nProcs, initializer=initWorker,
+                         initargs=([shm.name for shm in self.shms], (NX, NY)))
+
+    def step(self, n=1):
+        """advance the simulation by n generations"""
+        for i in range(n):
+            src, dst = self.cur, 1 - self.cur
+            # map() returns when all bands are done, so every band sees
+            # a complete previous generation
+            self.pool.map(stepBand, [(src, dst, r0, r1, self.table)
+                                     for (r0, r1) in self.bands])
+            self.cur = dst
+
+    def getGrid(self):
+        """returns the current grid as a 0/1 uint8 array - a view of
+        shared memory that is valid until close()"""
+        return self.grids[self.cur]
+
+    def close(self):
+        """stop the workers and free the shared memory"""
+        self.pool.close()
+        self.pool.join()
+        self.grids = []
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.shms = []
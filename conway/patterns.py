@@ -0,0 +1,157 @@
+"""
+patterns.py
+
+Reads Game of Life pattern files into 0/1 NumPy arrays: RLE (.rle),
+Life 1.06 (.lif, .life) and plaintext (.cells). Parsed patterns can be
+cached on disk, which makes large pattern libraries quick to reload,
+and many patterns can be stamped into a grid in one call.
+
+Author: Mahesh Venkitachalam
+"""
+
+import os, re
+import hashlib
+import numpy as np
+
+# RLE runs: an optional count followed by a tag - b (dead), $ (end of
+# row), or any other letter (alive, for multi-state files)
+rleToken = re.compile(r'(\d*)([a-zA-Z.$])')
+
+def parseRLE(text):
+    """returns the 0/1 uint8 array of an RLE pattern"""
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line and not line.startswith('#')]
+    # header: x = m, y = n[, rule = ...]
+    shape = None
+    if lines and lines[0].startswith('x'):
+        header = dict(re.findall(r'(\w+)\s*=\s*([^,\s]+)', lines.pop(0)))
+        shape = (int(header['y']), int(header['x']))
+    body = ''.join(lines).split('!')[0]
+    tokens = rleToken.findall(body)
+    if not tokens:
+        return np.zeros(shape or (0, 0), np.uint8)
+    counts = np.array([int(n) if n else 1 for (n, tag) in tokens])
+    tags = np.frombuffer(''.join(tag for (n, tag) in tokens).encode('ascii'),
+                         'S1')
+    newline = tags == b'$'
+    # row of each run: the number of rows ended before it
+    rowEnds = np.where(newline, counts, 0)
+    row = np.cumsum(rowEnds) - rowEnds
+    # column where each run starts: the cells since the last row end
+    width = np.where(newline, 0, counts)
+    start = np.cumsum(width) - width
+    ends = np.where(newline, np.arange(len(tags)), -1)
+    lastEnd = np.maximum.accumulate(ends)
+    rowStart = np.where(lastEnd >= 0, start[np.maximum(lastEnd, 0)], 0)
+    col = start - rowStart
+    # expand the live runs into cells, all at once
+    live = ~newline & (tags != b'b') & (tags != b'.')
+    counts, row, col = counts[live], row[live], col[live]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                  counts)
+    rows = np.repeat(row, counts)
+    cols = np.repeat(col, counts) + offsets
+    if shape is None:
+        shape = (rows.max() + 1, cols.max() + 1) if len(rows) else (0, 0)
+    cells = np.zeros(shape, np.uint8)
+    cells[rows, cols] = 1
+    return cells
+
+def parseLife106(text):
+    """returns the 0/1 uint8 array of a Life 1.06 pattern, a list of
+    live (x, y) cells"""
+    lines = [line for line in text.splitlines()
+             if line.strip() and not line.startswith('#')]
+    xy = np.array(' '.join(lines).split(), int).reshape(-1, 2)
+    if not len(xy):
+        return np.zeros((0, 0), np.uint8)
+    # x is the column and y the row - shift to the top left corner
+    xy -= xy.min(axis=0)
+    cells = np.zeros((xy[:, 1].max() + 1, xy[:, 0].max() + 1), np.uint8)
+    cells[xy[:, 1], xy[:, 0]] = 1
+    return cells
+
+def parsePlaintext(text):
+    """returns the 0/1 uint8 array of a plaintext pattern, with rows
+    of . (dead) and O (alive)"""
+    lines = [line.rstrip() for line in text.splitlines()
+             if not line.startswith('!')]
+    width = max((len(line) for line in lines), default=0)
+    # pad rows to the same width and read them as one block of bytes
+    chars = np.frombuffer(''.join(line.ljust(width, '.') for line in lines)
+                          .encode('ascii'), np.uint8)
+    cells = (chars == ord('O')) | (chars == ord('*'))
+    return cells.astype(np.uint8).reshape(len(lines), width)
+
+# pattern file parsers by extension
+parsers = {
+    '.rle': parseRLE,
+    '.lif': parseLife106,
+    '.life': parseLife106,
+    '.cells': parsePlaintext,
+}
+
+def cacheKey(fileName):
+    """returns a cache file name for a pattern file, which changes
+    whenever the file is modified"""
+    st = os.stat(fileName)
+    key = '{}:{}:{}'.format(os.path.abspath(fileName), st.st_mtime_ns,
+                            st.st_size)
+    return hashlib.sha1(key.encode()).hexdigest() + '.npz'
+
+def loadPattern(fileName, cacheDir=None):
+    """returns the 0/1 uint8 array of a pattern file. if cacheDir is
+    given, parsed patterns are kept there as bit-packed arrays."""
+    ext = os.path.splitext(fileName)[1].lower()
+    if ext not in parsers:
+        raise ValueError('unknown pattern format: {}'.format(fileName))
+    cacheFile = None
+    if cacheDir:
+        cacheFile = os.path.join(cacheDir, cacheKey(fileName))
+        if os.path.exists(cacheFile):
+            with np.load(cacheFile) as data:
+                shape = tuple(data['shape'])
+                bits = np.unpackbits(data['bits'], count=shape[0]*shape[1])
+                return bits.reshape(shape)
+    with open(fileName) as f:
+        cells = parsers[ext](f.read())
+    if cacheFile:
+        os.makedirs(cacheDir, exist_ok=True)
+        np.savez(cacheFile, shape=cells.shape, bits=np.packbits(cells))
+    return cells
+
+def loadPatternLibrary(dirName, cacheDir=None):
+    """returns a dict of name -> 0/1 array for all pattern files in
+    dirName. the parsed patterns are cached in cacheDir, by default
+    a .patterncache folder in dirName."""
+    if cacheDir is None:
+        cacheDir = os.path.join(dirName, '.patterncache')
+    library = {}
+    for fileName in sorted(os.listdir(dirName)):
+        name, ext = os.path.splitext(fileName)
+        if ext.lower() in parsers:
+            library[name] = loadPattern(os.path.join(dirName, fileName),
+                                        cacheDir)
+    return library
+
+def stampPatterns(grid, patterns, positions):
+    """sets the live cells of patterns in grid, with their top left
+    cells at positions (a list of (i, j)), wrapping around the edges.
+    patterns is a list with one pattern per position, or a single
+    pattern used at every position. other cells are left as they are."""
+    positions = np.asarray(positions, int).reshape(-1, 2)
+    if not len(positions):
+        return
+    if isinstance(patterns, np.ndarray):
+        patterns = [patterns]*len(positions)
+    # group the positions of each distinct pattern
+    groups = {}
+    for (k, pattern) in enumerate(patterns):
+        groups.setdefault(id(pattern), (pattern, []))[1].append(k)
+    cells = []
+    for (pattern, index) in groups.values():
+        # every live cell at every position of this pattern
+        live = np.argwhere(pattern)
+        cells.append((positions[index, np.newaxis, :] + live).reshape(-1, 2))
+    cells = np.concatenate(cells) % grid.shape
+    grid[cells[:, 0], cells[:, 1]] = 1
@@ -0,0 +1,101 @@
+"""
+rules.py
+
+Life-like cellular automaton rules in B/S notation, e.g. B3/S23 for
+Conway's Game of Life: a dead cell is born with 3 neighbors, and a
+live cell survives with 2 or 3. Each rule is compiled into a lookup
+table indexed by (state, neighbor count).
+
+Author: Mahesh Venkitachalam
+"""
+
+import re
+import numpy as np
+
+# some well known rules
+namedRules = {
+    'conway': 'B3/S23',
+    'highlife': 'B36/S23',
+    'daynight': 'B3678/S34678',
+    'seeds': 'B2/S',
+    'lifewithoutdeath': 'B3/S012345678',
+    'replicator': 'B1357/S1357',
+    'maze': 'B3/S12345',
+    '2x2': 'B36/S125',
+}
+
+def parseRule(rule):
+    """returns (birth, survive) neighbor counts of a rule given by name,
+    in B/S notation ('B36/S23') or in S/B notation ('23/36')"""
+    text = namedRules.get(rule.lower(), rule).upper().replace(' ', '')
+    m = re.fullmatch(r'B([0-8]*)/?S([0-8]*)', text)
+    if m:
+        birth, survive = m.groups()
+    else:
+        m = re.fullmatch(r'S?([0-8]*)/B?([0-8]*)', text)
+        if not m:
+            raise ValueError('invalid rule: {}'.format(rule))
+        survive, birth = m.groups()
+    return (frozenset(int(c) for c in birth),
+            frozenset(int(c) for c in survive))
+
+def isConway(rule):
+    """returns True if rule is None or Conway's B3/S23"""
+    return rule is None or parseRule(rule) == parseRule('conway')
+
+def ruleTable(rule):
+    """returns the (2, 9) uint8 table of next states, indexed by
+    (state, neighbor count)"""
+    birth, survive = parseRule(rule)
+    table = np.zeros((2, 9), np.uint8)
+    table[0, list(birth)] = 1
+    table[1, list(survive)] = 1
+    return table
+
+def applyTable(table, grid, total):
+    """returns the next generation of a 0/1 grid, given its 3x3 block
+    sums (cell included) and a rule table, as an OR of masks like the
+    fast Conway path"""
+    # the block sum v is v neighbors for a dead cell, v - 1 for a live
+    # one: a sum that gives birth and survival sets any cell, others
+    # only dead or only live cells
+    new = None
+    alive = None
+    for v in range(10):
+        born = v < 9 and table[0, v]
+        survives = v > 0 and table[1, v - 1]
+        if not (born or survives):
+            continue
+        match = total == v
+        if born != survives:
+            if alive is None:
+                alive = grid == 1
+            match &= alive if survives else ~alive
+        if new is None:
+            new = match
+        else:
+            new |= match
+    if new is None:
+        return np.zeros(grid.shape, np.uint8)
+    return new.view(np.uint8)
+
+def blockSum(grid):
+    """returns the 3x3 block sums (cell included) of a 0/1 uint8 grid,
+    wrapping around so that the simulation takes place on a toroidal
+    surface"""
+    # sum of each cell and its vertical neighbors
+    cols = grid + np.roll(grid, 1, axis=0)
+    cols += np.roll(grid, -1, axis=0)
+    # add horizontal neighbors to get the 3x3 block sum
+    total = cols + np.roll(cols, 1, axis=1)
+    total += np.roll(cols, -1, axis=1)
+    return total
+
+def nextGen(grid, total, table=None):
+    """returns the next generation of a 0/1 grid given its 3x3 block
+    sums, using Conway's rules or a rule table from ruleTable()"""
+    if table is not None:
+        return applyTable(table, grid, total)
+    # apply Conway's rules: the block sum is 3 for a birth or a live
+    # cell with 2 neighbors, and 4 for a live cell with 3 neighbors
+    return ((total == 3) | ((total == 4) & (grid == 1))).view(np.uint8)
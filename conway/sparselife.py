@@ -0,0 +1,101 @@
+"""
+sparselife.py
+
+A Game of Life engine that only recomputes the parts of the board
+that can change: the grid is split into square tiles, and a tile is
+updated only if it, or one of its 8 neighbor tiles, changed in the
+previous generation. Boards that have settled into still lifes cost
+almost nothing.
+
+Author: Mahesh Venkitachalam
+"""
+
+import numpy as np
+
+from rules import isConway, ruleTable, blockSum, nextGen
+
+class SparseLife:
+    """Game of Life on a toroidal grid with dirty-tile tracking"""
+    def __init__(self, grid, rule=None, tile=32, denseFraction=0.3):
+        """initialize from a 0/1 grid and an optional B/S rule, using
+        tile x tile blocks. when more than denseFraction of the tiles
+        are active, the whole grid is stepped at once, which is cheaper.
+        rules where empty space comes alive (B0) are not supported."""
+        self.table = None if isConway(rule) else ruleTable(rule)
+        if self.table is not None and self.table[0, 0]:
+            raise ValueError('B0 rules change empty tiles')
+        self.grid = grid.astype(np.uint8)
+        self.tile = tile
+        self.denseFraction = denseFraction
+        NX, NY = grid.shape
+        TX, TY = -(-NX//tile), -(-NY//tile)
+        self.tileShape = (TX, TY)
+        # tiles to recompute in the next generation - all of them at first
+        self.active = np.ones((TX, TY), bool)
+        # cell offsets of a tile with its one-cell halo
+        self.ramp = np.arange(-1, tile + 1)
+
+    def step(self, n=1):
+        """advance the simulation by n generations"""
+        NX, NY = self.grid.shape
+        T = self.tile
+        for i in range(n):
+            if self.active.mean() > self.denseFraction:
+                dirty = self.stepDense()
+                self.active = self.dilate(dirty)
+                continue
+            ti, tj = np.nonzero(self.active)
+            if len(ti) == 0:
+                # nothing can change any more
+                return
+            # gather active tiles with halos, wrapping around the edges:
+            # shape (K, T+2, T+2). the last row/column of tiles may be
+            # partial, then the wrapped cells past its end are ignored.
+            rows = (T*ti[:, np.newaxis] + self.ramp) % NX
+            cols = (T*tj[:, np.newaxis] + self.ramp) % NY
+            blocks = self.grid[rows[:, :, np.newaxis], cols[:, np.newaxis, :]]
+            # 3x3 block sums of the tile cells
+            vsum = blocks[:, :-2] + blocks[:, 1:-1] + blocks[:, 2:]
+            total = vsum[:, :, :-2] + vsum[:, :, 1:-1] + vsum[:, :, 2:]
+            old = blocks[:, 1:-1, 1:-1]
+            new = nextGen(old, total, self.table)
+            # cells that really lie in each tile
+            validR = T*ti[:, np.newaxis] + np.arange(T) < NX
+            validC = T*tj[:, np.newaxis] + np.arange(T) < NY
+            valid = validR[:, :, np.newaxis] & validC[:, np.newaxis, :]
+            changed = ((new != old) & valid).any(axis=(1, 2))
+            # write back the tiles that changed
+            k = np.flatnonzero(changed)
+            shape = (len(k), T, T)
+            R = np.broadcast_to(rows[k, 1:-1, np.newaxis], shape)
+            C = np.broadcast_to(cols[k, np.newaxis, 1:-1], shape)
+            mask = valid[k]
+            self.grid[R[mask], C[mask]] = new[k][mask]
+            # next time, look at changed tiles and their neighbors
+            dirty = np.zeros_like(self.active)
+            dirty[ti[k], tj[k]] = True
+            self.active = self.dilate(dirty)
+
+    def stepDense(self):
+        """step the whole grid and return the tiles that changed"""
+        grid = self.grid
+        new = nextGen(grid, blockSum(grid), self.table)
+        # find changed tiles, padding the grid to whole tiles
+        (TX, TY), T = self.tileShape, self.tile
+        diff = np.zeros((TX*T, TY*T), bool)
+        diff[:grid.shape[0], :grid.shape[1]] = new != grid
+        self.grid = new
+        return diff.reshape(TX, T, TY, T).any(axis=(1, 3))
+
+    def dilate(self, dirty):
+        """returns the dirty tiles plus their 8 neighbors, wrapping around"""
+        rows3 = dirty | np.roll(dirty, 1, axis=0) | np.roll(dirty, -1, axis=0)
+        return rows3 | np.roll(rows3, 1, axis=1) | np.roll(rows3, -1, axis=1)
+
+    def activeFraction(self):
+        """returns the fraction of tiles that the next step will compute"""
+        return self.active.mean()
+
+    def getGrid(self):
+        """returns the current grid as a 0/1 uint8 array"""
+        return self.grid
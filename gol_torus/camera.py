@@ -35,9 +35,12 @@ class OrbitCamera:
         U = U / np.linalg.norm(U)
         return U
 
-    def rotate(self):
-        """Rotate by one step and compute new camera parameters."""
-        self.beta = (self.beta + self.beta_step) % 360
+    def rotate(self, step=None):
+        """Rotate by step degrees (default: beta_step) and compute new
+        camera parameters."""
+        if step is None:
+            step = self.beta_step
+        self.beta = (self.beta + step) % 360
         # recalculate eye E 
         self.eye = np.array([self.radius*math.cos(math.radians(self.beta)), 
                     self.radius*math.sin(math.radians(self.beta)), 
@@ -9,63 +9,65 @@
 
 import numpy as np
 
+# rules are shared with the conway project - add conway/ to PYTHONPATH
+from rules import blockSum, isConway, nextGen, ruleTable
+
 class GOL:
     """GOL - class that implements Conway's Game of Life
     """
-    def __init__(self, NX, NY, glider):
+    def __init__(self, NX, NY, glider, engine=None, rule=None):
         """GOL constructor
+
+        engine is an optional life engine class from the conway project 
+        (e.g. bitlife.BitLife) that is created from the 0/1 grid and 
+        provides step() and getGrid(). rule is an optional B/S rule
+        string like 'B36/S23' (see the conway project's rules.py) -
+        Conway's rules are used if it is None.
         """
         # a grid of NX x NY random values
         self.NX, self.NY = NX, NY
         if glider:
             self.addGlider(1, 1, NX, NY)
         else:
-            self.grid = np.random.choice([1, 0], NX * NY, p=[0.2, 0.8]).reshape(NX, NY) 
+            self.grid = np.random.choice(np.array([1, 0], np.uint8), NX * NY, 
+                                         p=[0.2, 0.8]).reshape(NX, NY) 
+        # rule lookup table, None for Conway's rules
+        self.table = None if isConway(rule) else ruleTable(rule)
+        self.life = engine(self.grid, rule) if engine else None
+        # colors of dead (white) and live (black) cells
+        self.palette = np.array([[1.0, 1.0, 1.0],
+                                 [0.0, 0.0, 0.0]], np.float32)
 
     def addGlider(self, i, j, NX, NY):
         """adds a glider with top left cell at (i, j)"""
-        self.grid = np.zeros(NX * NY).reshape(NX, NY)
+        self.grid = np.zeros(NX * NY, np.uint8).reshape(NX, NY)
         glider = np.array([[0,    0, 1], 
                         [1,  0, 1], 
-                        [0,  1, 1]])
+                        [0,  1, 1]], np.uint8)
         self.grid[i:i+3, j:j+3] = glider
 
+    def close(self):
+        """shut down the engine's worker processes and shared memory,
+        if it has any"""
+        if hasattr(self.life, 'close'):
+            self.life.close()
+
     def update(self):
         """Update the GOL simulation by one time step.
         """
-        # copy grid since we require 8 neighbors for calculation
-        # and we go line by line 
-        newGrid = self.grid.copy()
-        NX, NY = self.NX, self.NY
-        for i in range(NX):
-            for j in range(NY):
-                # compute 8-neghbor sum
-                # using toroidal boundary conditions - x and y wrap around 
-                # so that the simulaton takes place on a toroidal surface.
-                total = (self.grid[i, (j-1) % NY] + self.grid[i, (j+1) % NY] + 
-                        self.grid[(i-1) % NX, j] + self.grid[(i+1) % NX, j] + 
-                        self.grid[(i-1) % NX, (j-1) % NY] + self.grid[(i-1) % NX, (j+1) % NY] + 
-                        self.grid[(i+1) % NX, (j-1) % NY] + self.grid[(i+1) % NX, (j+1) % NY])
-                # apply Conway's rules
-                if self.grid[i, j]  == 1:
-                    if (total < 2) or (total > 3):
-                        newGrid[i, j] = 0
-                else:
-                    if total == 3:
-                        newGrid[i, j] = 1
-        # update data
-        self.grid[:] = newGrid[:]
+        if self.life:
+            self.life.step()
+            self.grid = self.life.getGrid()
+            return
+        # toroidal boundary conditions - x and y wrap around so that
+        # the simulaton takes place on a toroidal surface.
+        self.grid = nextGen(self.grid, blockSum(self.grid), self.table)
 
-    def get_colors(self):
-        """returns a dictionary of colors
+    def get_colors(self, grid=None):
+        """returns an (NX, NY, 3) float32 array of cell colors, for the
+        current grid or a given copy of it
         """
-        colors = {}
-        c1 = np.array([1.0, 1.0, 1.0], np.float32)
-        c2 = np.array([0.0, 0.0, 0.0], np.float32)
-        for i in range(self.NX):
-            for j in range (self.NY):
-                if self.grid[i, j] == 1:
-                    colors[(i, j)] = c2
-                else :
-                    colors[(i, j)] = c1 
-        return colors
+        if grid is None:
+            grid = self.grid
+        # look up the color of every cell by its 0/1 state
+        return self.palette[grid]
@@ -11,6 +11,9 @@ from OpenGL.GL import *
 
 import numpy, math, sys, os
 import argparse
+import threading, time
+import ctypes, queue
+from PIL import Image
 import glutils
 
 import glfw
@@ -21,7 +24,16 @@ from gol import GOL
 
 class RenderWindow:
     """GLFW Rendering window class"""
-    def __init__(self, glider):
+    def __init__(self, glider, engine=None, rule=None, gpu_state=False,
+                 gens_per_sec=2.0, offscreen=False, grid_size=64,
+                 instanced=False, geometry_cache=None):
+
+        # create the simulation first - engines may start worker
+        # processes, which should not fork a process holding a window
+        # and GL context
+        NX = grid_size
+        NY = grid_size
+        self.gol = GOL(NX, NY, glider, engine, rule)
 
         # save current working directory
         cwd = os.getcwd()
@@ -38,6 +50,10 @@ class RenderWindow:
         glfw.glfwWindowHint(glfw.GLFW_OPENGL_FORWARD_COMPAT, GL_TRUE)
         glfw.glfwWindowHint(glfw.GLFW_OPENGL_PROFILE, 
                             glfw.GLFW_OPENGL_CORE_PROFILE)
+        if offscreen:
+            # the window only provides a GL context - frames are
+            # rendered into a framebuffer object
+            glfw.glfwWindowHint(glfw.GLFW_VISIBLE, GL_FALSE)
     
         # make a window
         self.width, self.height = 640, 480
@@ -46,24 +62,27 @@ class RenderWindow:
                                          b'gol_torus')
         # make context current
         glfw.glfwMakeContextCurrent(self.win)
+        # render at the display refresh rate
+        glfw.glfwSwapInterval(1)
         
         # initialize GL
         glViewport(0, 0, self.width, self.height)
         glEnable(GL_DEPTH_TEST)
         #glClearColor(0.2, 0.2, 0.2,1.0)
         glClearColor(0.11764706, 0.11764706, 0.11764706, 1.0)
+        if offscreen:
+            self.setup_fbo()
 
         # set window callbacks
         glfw.glfwSetMouseButtonCallback(self.win, self.onMouseButton)
         glfw.glfwSetKeyCallback(self.win, self.onKeyboard)
 
         # create 3D
-        NX = 64
-        NY = 64
         R = 4.0
         r = 1.0
-        self.torus = Torus(R, r, NX, NY)
-        self.gol = GOL(NX, NY, glider)
+        self.torus = Torus(R, r, NX, NY, gpu_state, instanced,
+                           geometry_cache)
+        self.gpu_state = self.torus.gpu_state
 
         # create a camera
         self.camera = OrbitCamera(5.0, 10.0)
@@ -71,11 +90,21 @@ class RenderWindow:
         # exit flag
         self.exitNow = False
 
-        # rotation flag
+        # rotation flag - also pauses the simulation
         self.rotate = True
 
-        # skip count
-        self.skip = 0
+        # camera rotation speed, in degrees/second
+        self.deg_per_sec = 20.0
+
+        # the simulation runs on its own thread at gens_per_sec: it
+        # copies each new generation into the back grid, then swaps
+        # it with the front grid, which the render thread displays
+        self.gens_per_sec = gens_per_sec
+        self.front = self.gol.grid.copy()
+        self.back = numpy.empty_like(self.front)
+        self.lock = threading.Lock()
+        self.new_gen = True
+        self.sim_thread = None
         
     def onMouseButton(self, win, button, action, mods):
         #print 'mouse button: ', win, button, action, mods
@@ -91,60 +120,190 @@ class RenderWindow:
                 self.rotate = not self.rotate 
     
 
+    def setup_fbo(self):
+        """create an offscreen framebuffer, and two pixel pack buffers
+        for asynchronous readback of the frames"""
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        colorRB, depthRB = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, colorRB)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, self.width,
+                              self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0,
+                                  GL_RENDERBUFFER, colorRB)
+        glBindRenderbuffer(GL_RENDERBUFFER, depthRB)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24,
+                              self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT,
+                                  GL_RENDERBUFFER, depthRB)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('could not create offscreen framebuffer')
+        # RGBA frames
+        self.frame_bytes = 4*self.width*self.height
+        self.pbos = glGenBuffers(2)
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_bytes, None,
+                         GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    def draw(self):
+        """render one frame with the current camera and GOL state"""
+        # set viewport
+        glViewport(0, 0, self.width, self.height)
+
+        # clear
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        # build projection matrix
+        pMatrix = glutils.perspective(60.0, self.aspect, 0.1, 100.0)
+
+        mvMatrix = glutils.lookAt(self.camera.eye, self.camera.center,
+                                  self.camera.up)
+
+        # show the latest generation
+        self.step()
+
+        # render
+        self.torus.render(pMatrix, mvMatrix)
+
     def run(self):
+        # start the simulation
+        self.sim_thread = threading.Thread(target=self.simulate, daemon=True)
+        self.sim_thread.start()
         # initializer timer
         glfw.glfwSetTime(0)
         t = 0.0
         while not glfw.glfwWindowShouldClose(self.win) and not self.exitNow:
-            # update every x seconds
+            # time since the last frame
             currT = glfw.glfwGetTime()
-            if currT - t > 0.05:
-                # update time
-                t = currT
-
-                # set viewport
-                self.width, self.height = glfw.glfwGetFramebufferSize(self.win)
-                self.aspect = self.width/float(self.height)
-                glViewport(0, 0, self.width, self.height)
-
-                # clear
-                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-                
-                # build projection matrix
-                pMatrix = glutils.perspective(60.0, self.aspect, 0.1, 100.0)
-                
-                mvMatrix = glutils.lookAt(self.camera.eye, self.camera.center, 
-                                          self.camera.up)
-                
-                # render
-                self.torus.render(pMatrix, mvMatrix)
-                
-                # step 
-                if self.rotate: 
-                    self.step()
-
-                glfw.glfwSwapBuffers(self.win)
-                # Poll for and process events
-                glfw.glfwPollEvents()
+            dt = currT - t
+            t = currT
+
+            # track the window size
+            self.width, self.height = glfw.glfwGetFramebufferSize(self.win)
+            self.aspect = self.width/float(self.height)
+
+            # render
+            self.draw()
+
+            # rotate camera by the elapsed time
+            if self.rotate:
+                self.camera.rotate(self.deg_per_sec*dt)
+
+            # waits for vsync
+            glfw.glfwSwapBuffers(self.win)
+            # Poll for and process events
+            glfw.glfwPollEvents()
         # end
+        self.exitNow = True
+        self.sim_thread.join()
+        self.gol.close()
+        glfw.glfwTerminate()
+
+    def run_offscreen(self, n_frames, frame_dir, fps=30.0):
+        """render n_frames frames offscreen and save them as PNG files
+        in frame_dir. the simulation and camera advance by 1/fps
+        seconds per frame, so the frames play back at fps."""
+        os.makedirs(frame_dir, exist_ok=True)
+        # frames are saved by a writer thread while rendering goes on
+        frames = queue.Queue(maxsize=8)
+        writer = threading.Thread(target=self.write_frames,
+                                  args=(frames, frame_dir))
+        writer.start()
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        gens_per_frame = self.gens_per_sec/fps
+        start = time.perf_counter()
+        for k in range(n_frames + 1):
+            if k < n_frames:
+                # advance the simulation to the time of frame k
+                if k > 0:
+                    for i in range(int(k*gens_per_frame) -
+                                   int((k - 1)*gens_per_frame)):
+                        self.gol.update()
+                    numpy.copyto(self.front, self.gol.grid)
+                    self.new_gen = True
+                self.draw()
+                self.camera.rotate(self.deg_per_sec/fps)
+                # start reading frame k into one pixel buffer - this
+                # returns without waiting for the GPU
+                glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[k % 2])
+                glReadPixels(0, 0, self.width, self.height, GL_RGBA,
+                             GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+            if k > 0:
+                # frame k - 1, in the other buffer, has had a whole
+                # frame to arrive
+                glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[(k - 1) % 2])
+                ptr = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0,
+                                       self.frame_bytes, GL_MAP_READ_BIT)
+                data = ctypes.cast(ptr, ctypes.POINTER(ctypes.c_ubyte))
+                pixels = numpy.ctypeslib.as_array(data, (self.frame_bytes,))
+                frames.put((k - 1, pixels.copy()))
+                glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        # wait for the writer
+        frames.put(None)
+        writer.join()
+        elapsed = time.perf_counter() - start
+        print('{} frames of {}x{} in {:.2f} s: {:.1f} frames/s'.format(
+            n_frames, self.width, self.height, elapsed, n_frames/elapsed))
+        self.gol.close()
         glfw.glfwTerminate()
 
-    def step(self):    
+    def write_frames(self, frames, frame_dir):
+        """writer thread - saves (index, RGBA pixels) frames from a
+        queue until it gets None"""
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            k, pixels = item
+            # GL rows start at the bottom of the image
+            img = pixels.reshape(self.height, self.width, 4)[::-1]
+            Image.fromarray(img).save(os.path.join(frame_dir,
+                                                   'frame{:05d}.png'.format(k)))
 
-        if self.skip == 9:
-            # update GOL
+    def simulate(self):
+        """simulation thread - updates GOL at a fixed gens_per_sec"""
+        dt = 1.0/self.gens_per_sec
+        next_t = time.perf_counter() + dt
+        while not self.exitNow:
+            now = time.perf_counter()
+            if not self.rotate:
+                # paused - restart the schedule when resumed
+                next_t = now + dt
+                time.sleep(min(dt, 0.05))
+                continue
+            if now < next_t:
+                time.sleep(next_t - now)
+                continue
+            # update GOL and publish the new grid
             self.gol.update()
-            colors = self.gol.get_colors()
-            self.torus.set_colors(colors)
-            # step 
-            self.torus.step()
-            # reset 
-            self.skip = 0
-        
-        # update skip
-        self.skip += 1
-        # rotate camera
-        self.camera.rotate()
+            numpy.copyto(self.back, self.gol.grid)
+            with self.lock:
+                self.front, self.back = self.back, self.front
+                self.new_gen = True
+            # fixed timestep - but if a generation takes longer than
+            # dt, don't try to catch up
+            next_t = max(next_t + dt, now)
+
+    def step(self):
+        """upload the latest generation from the simulation thread, if
+        there is a new one"""
+        with self.lock:
+            if not self.new_gen:
+                return
+            self.new_gen = False
+            if self.gpu_state:
+                # upload one byte per cell
+                self.torus.set_state(self.front)
+            else:
+                colors = self.gol.get_colors(self.front)
+                self.torus.set_colors(colors)
+        # step
+        self.torus.step()
 
 # main() function
 def main():
@@ -153,14 +312,72 @@ def main():
     parser = argparse.ArgumentParser(description="Runs Conway's Game of Life simulation on a Torus.")
     # add arguments
     parser.add_argument('--glider', action='store_true', required=False)
+    parser.add_argument('--engine', choices=['numpy', 'bitpacked', 'parallel'],
+                        default='numpy', required=False,
+                        help="life engine - the bitpacked and parallel "
+                             "engines come from the conway project, like "
+                             "the rules (add conway/ to PYTHONPATH)")
+    parser.add_argument('--rule', dest='rule', required=False,
+                        help="life-like rule in B/S notation (e.g. B36/S23) "
+                             "or a name like 'highlife'")
+    parser.add_argument('--gpu-state', dest='gpu_state', action='store_true',
+                        required=False,
+                        help="keep the GOL grid in a texture that the "
+                             "shader reads, instead of vertex colors")
+    parser.add_argument('--instanced', action='store_true', required=False,
+                        help="compute the torus mesh on the GPU, one "
+                             "instance per cell - for large grids, "
+                             "implies --gpu-state")
+    parser.add_argument('--grid-size', dest='grid_size', type=int,
+                        default=64, required=False,
+                        help="GOL grid size (default: 64)")
+    parser.add_argument('--geometry-cache', dest='geometry_cache',
+                        required=False,
+                        help="folder for cached torus vertices/normals, "
+                             "reused by later runs with the same grid size")
+    parser.add_argument('--gens-per-sec', dest='gens_per_sec', type=float,
+                        default=2.0, required=False,
+                        help="GOL generations per second (default: 2)")
+    parser.add_argument('--offscreen', dest='n_frames', type=int,
+                        required=False,
+                        help="render N_FRAMES frames to PNG files with a "
+                             "hidden window - for software GL, set "
+                             "LIBGL_ALWAYS_SOFTWARE=1, and without a "
+                             "display, run under xvfb-run")
+    parser.add_argument('--frame-dir', dest='frame_dir', default='frames',
+                        required=False,
+                        help="folder for --offscreen frames")
     args = parser.parse_args()
+    if args.grid_size < 3:
+        parser.error('--grid-size must be at least 3')
+    if args.gens_per_sec <= 0:
+        parser.error('--gens-per-sec must be positive')
+    if args.n_frames is not None and args.n_frames < 1:
+        parser.error('--offscreen needs at least one frame')
 
     # set args
     glider = False
     if args.glider:
         glider = True
+
+    engine = None
+    if args.engine == 'bitpacked':
+        from bitlife import BitLife
+        engine = BitLife
+    elif args.engine == 'parallel':
+        from parlife import ParLife
+        engine = ParLife
         
-    rw = RenderWindow(glider)
+    if args.n_frames is not None:
+        rw = RenderWindow(glider, engine, args.rule, args.gpu_state,
+                          args.gens_per_sec, True, args.grid_size,
+                          args.instanced, args.geometry_cache)
+        rw.run_offscreen(args.n_frames, args.frame_dir)
+        return
+
+    rw = RenderWindow(glider, engine, args.rule, args.gpu_state,
+                      args.gens_per_sec, False, args.grid_size,
+                      args.instanced, args.geometry_cache)
     rw.run()
 
 # call main
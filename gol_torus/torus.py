@@ -10,7 +10,7 @@ import OpenGL
 from OpenGL.GL import *
 
 import numpy as np  
-import math, sys, os
+import sys, os
 import glutils
 
 import glfw
@@ -59,14 +59,122 @@ void main() {
 }
 """
 
+# shaders for GPU state mode - cell colors come from the GOL grid,
+# stored in a one byte per cell texture, instead of a color attribute
+strVSState = """
+#version 410 core
+
+layout(location = 0) in vec3 aVert;
+layout(location = 1) in ivec2 aCell;
+layout(location = 2) in vec3 aNormal;
+
+uniform mat4 uMVMatrix;
+uniform mat4 uPMatrix;
+
+flat out ivec2 vCell;
+out vec3 vNormal;
+out vec3 fragPos;
+
+void main() {
+  // transform vertex
+  gl_Position = uPMatrix * uMVMatrix * vec4(aVert, 1.0);
+  fragPos = aVert;
+  vCell = aCell;
+  vNormal = aNormal;
+}
+"""
+strFSState = """
+#version 410 core
+
+flat in ivec2 vCell;
+in vec3 vNormal;
+in vec3 fragPos;
+
+uniform sampler2D uState;
+
+out vec4 fragColor;
+
+void main() {
+  // GOL cell (i, j) is texel (j, i) - live cells are black,
+  // dead cells white
+  float alive = texelFetch(uState, vCell.yx, 0).r;
+  vec3 vColor = vec3(alive > 0.0 ? 0.0 : 1.0);
+  vec3 lightPos = vec3(10.0, 10.0, 10.0);
+  vec3 lightColor = vec3(1.0, 1.0, 1.0);
+  vec3 lightDir = normalize(lightPos - fragPos);
+  float diff = max(dot(vNormal, lightDir), 0.0);
+  vec3 diffuse = diff * lightColor;
+  float ambient = 0.1;
+  vec3 result = (ambient + diffuse) * vColor.xyz;
+  fragColor = vec4(result, 1.0);
+}
+"""
+
+# vertex shader for instanced mode - there are no vertex buffers: each
+# instance is one GOL cell, and its two triangles are computed from
+# the cell (i, j) and the torus parameters
+strVSInstanced = """
+#version 410 core
+
+uniform mat4 uMVMatrix;
+uniform mat4 uPMatrix;
+
+// torus radii and GOL grid size (NX, NY)
+uniform float uR;
+uniform float ur;
+uniform ivec2 uSize;
+
+flat out ivec2 vCell;
+out vec3 vNormal;
+out vec3 fragPos;
+
+// corners (di, dj) of triangles (A, B, D) and (A, D, C) of a cell
+const ivec2 corners[6] = ivec2[6](ivec2(0, 0), ivec2(1, 0), ivec2(1, 1),
+                                  ivec2(0, 0), ivec2(1, 1), ivec2(0, 1));
+
+void main() {
+  ivec2 cell = ivec2(gl_InstanceID / uSize.y, gl_InstanceID % uSize.y);
+  // ring i and point j of this corner, wrapping around
+  ivec2 ij = (cell + corners[gl_VertexID]) % uSize;
+  float alpha = 6.28318530718 * float(ij.x) / float(uSize.x);
+  float theta = 6.28318530718 * float(ij.y) / float(uSize.y);
+  // same vertices and normals as Torus.compute_vertices()
+  vec3 normal = ur * vec3(cos(theta)*cos(alpha), cos(theta)*sin(alpha),
+                          sin(theta));
+  vec3 vert = normal + vec3(uR*cos(alpha), uR*sin(alpha), 0.0);
+  // transform vertex
+  gl_Position = uPMatrix * uMVMatrix * vec4(vert, 1.0);
+  fragPos = vert;
+  vCell = cell;
+  vNormal = normal;
+}
+"""
+
 class Torus:    
     """ OpenGL 3D scene class"""
     # initialization
-    def __init__(self, R, r, NX, NY):
-        global strVS, strFS
+    def __init__(self, R, r, NX, NY, gpu_state=False, instanced=False,
+                 cache_dir=None):
+        """gpu_state: take cell colors from a GOL state texture,
+        updated with set_state(), instead of vertex colors.
+        instanced: compute the mesh in the vertex shader, one instance
+        per cell, so no geometry is stored - implies gpu_state.
+        cache_dir: folder for cached vertices and normals."""
+        global strVS, strFS, strVSState, strFSState, strVSInstanced
 
         # create shader
-        self.program = glutils.loadShaders(strVS, strFS)
+        self.instanced = instanced
+        self.gpu_state = gpu_state or instanced
+        if instanced:
+            self.program = glutils.loadShaders(strVSInstanced, strFSState)
+            self.stateUniform = glGetUniformLocation(self.program,
+                                                     b'uState')
+        elif gpu_state:
+            self.program = glutils.loadShaders(strVSState, strFSState)
+            self.stateUniform = glGetUniformLocation(self.program,
+                                                     b'uState')
+        else:
+            self.program = glutils.loadShaders(strVS, strFS)
 
         glProvokingVertex(GL_FIRST_VERTEX_CONVENTION)
 
@@ -88,159 +196,106 @@ class Torus:
         # time
         self.t = 0 
 
-        # compute parameters for glMultiDrawArrays
-        M1 = 2*self.M + 2 
-        self.first_indices = [2*M1*i for i in range(self.N)]
-        self.counts = [2*M1 for i in range(self.N)]
-
-        # colors: {(i, j) : (r, g, b)}
-        # with NX * NY entries 
-        self.colors_dict = self.init_colors(self.NX, self.NY)
-        
-        # create an empty array to hold colors
-        self.colors = np.zeros((3*self.N*(2*self.M + 2), ), np.float32)
+        if instanced:
+            # set the torus parameters once
+            glUseProgram(self.program)
+            glUniform1f(glGetUniformLocation(self.program, b'uR'), R)
+            glUniform1f(glGetUniformLocation(self.program, b'ur'), r)
+            glUniform2i(glGetUniformLocation(self.program, b'uSize'), NX, NY)
+            glUseProgram(0)
+            # core profile needs a VAO bound to draw, even an empty one
+            self.vao = glGenVertexArrays(1)
+            self.setup_state_texture()
+            return
+
+        # vertex colors - vertex V_i_j has the color of cell (i, j)
+        # - all white to start with
+        self.colors = np.ones((3*self.N*self.M, ), np.float32)
 
         # get vertices, normals, indices
-        vertices, normals = self.compute_vertices()
-        self.compute_colors()
+        vertices, normals = self.load_vertices(cache_dir)
+        indices = self.compute_indices()
+        self.n_indices = len(indices)
         # set up vertex buffer objects
-        self.setup_vao(vertices, normals, self.colors)
+        self.setup_vao(vertices, normals, self.colors, indices)
+        if self.gpu_state:
+            self.setup_state_texture()
     
-    def init_colors(self, NX, NY):
-        """initialise color dictionary
-        """
-        colors = {}
-        c1 = [1.0, 1.0, 1.0]
-        for i in range(NX):
-            for j in range (NY):
-                colors[(i, j)] = c1
-        return colors
-
-    def compute_rt(self, R, alpha):
-        # compute position of ring 
-        Tx = R*math.cos(alpha)
-        Ty = R*math.sin(alpha)
-        Tz = 0.0
-
-        # rotation matrix
-        RM = np.array([
-            [math.cos(alpha), -math.sin(alpha), 0.0, 0.0], 
-            [math.sin(alpha), math.cos(alpha), 0.0, 0.0],
-            [0.0, 0.0, 1.0, 0.0], 
-            [0.0, 0.0, 0.0, 1.0]
-            ], dtype=np.float32)
-
-        # translation matrix
-        TM = np.array([
-            [1.0, 0.0, 0.0, Tx], 
-            [0.0, 1.0, 0.0, Ty], 
-            [0.0, 0.0, 1.0, Tz], 
-            [0.0, 0.0, 0.0, 1.0]
-            ], dtype=np.float32)
-
-        return (RM, TM)
-
-    def compute_pt(self, r, theta, RM, TM):
-        # compute point coords
-        P = np.array([r*math.cos(theta), 0.0, r*math.sin(theta), 1.0], dtype=np.float32)
-        #print(P)
-        # apply rotation - this also gives us the vertex normals
-        NV = np.dot(RM, P)
-        # normalize 
-        #NV = NV / np.linalg.norm(NV)
-        # apply translation 
-        Pt = np.dot(TM, NV)
-
-        return (Pt, NV)
-
     def compute_vertices(self):
-        """ Compute vertices for the torus. 
-            returns np float32 array of n coords (x, y, z): shape (3*n, )
+        """ Compute vertices for the torus, one per GOL cell.
+            returns np float32 arrays of n coords (x, y, z) for the
+            vertices and the normals: shape (3*n, ), with n = N*M
         """
 
         R, r, N, M = self.R, self.r, self.N, self.M
-        
-        # create an empty array to hold vertices/normals
-        vertices = []
-        normals = []
 
         # The points on the ring are generated on the X-Z plane.
-        # Then they are rotated and translated into the correct 
-        # position on the torus.
-
-        # for all N rings around the torus 
-        for i in range(N):
-
-            # for all M points around a ring 
-            for j in range(M+1):
-
-                # compute angle theta of point 
-                theta = (j % M) *2*math.pi/M
-
-                #---ring #1------
-
-                # compute angle
-                alpha1 = i*2*math.pi/N
-                # compute transforms 
-                RM1, TM1 = self.compute_rt(R, alpha1)
-                # compute points 
-                Pt1, NV1 = self.compute_pt(r, theta, RM1, TM1)
-
-                #---ring #2------
-                # index of next ring 
-                ip1 = (i + 1) % N
-
-                # compute angle
-                alpha2 = ip1*2*math.pi/N
-                # compute transforms 
-                RM2, TM2 = self.compute_rt(R, alpha2)
-                # compute points 
-                Pt2, NV2 = self.compute_pt(r, theta, RM2, TM2)
-                
-                # store vertices/normals in correct order for GL_TRIANGLE_STRIP
-                vertices.append(Pt1[0:3])
-                vertices.append(Pt2[0:3])
-
-                # add normals
-                normals.append(NV1[0:3])
-                normals.append(NV2[0:3])
-
-        # return vertices and colors in correct format 
-        vertices = np.array(vertices, np.float32).reshape(-1)
-        normals = np.array(normals, np.float32).reshape(-1)
-        #print(vertices.shape)
+        # Then they are rotated by alpha around Z and translated by R
+        # into the correct position on the torus - all (i, j) at once.
+
+        # angle alpha of ring i, angle theta of point j on a ring
+        alpha = (2*np.pi/N)*np.arange(N)[:, np.newaxis]
+        theta = (2*np.pi/M)*np.arange(M)[np.newaxis, :]
+        ca, sa = np.cos(alpha), np.sin(alpha)
+        ct, st = np.cos(theta), np.sin(theta)
+
+        # the rotated ring point is also the vertex normal (of length r)
+        normals = np.empty((N, M, 3), np.float32)
+        normals[..., 0] = r*ct*ca
+        normals[..., 1] = r*ct*sa
+        normals[..., 2] = r*st
+        # translate to the ring position
+        vertices = normals.copy()
+        vertices[..., 0] += R*ca
+        vertices[..., 1] += R*sa
+
+        return vertices.reshape(-1), normals.reshape(-1)
+
+    def load_vertices(self, cache_dir):
+        """ Get vertices and normals from the cache in cache_dir, or
+            compute them (and cache them if cache_dir is set).
+        """
+        if not cache_dir:
+            return self.compute_vertices()
+        # one file per geometry, holding the stacked vertices and normals
+        name = 'torus_{}_{}_{}x{}.npy'.format(self.R, self.r, self.N, self.M)
+        path = os.path.join(cache_dir, name)
+        if os.path.exists(path):
+            # memory mapped - read straight into the GL buffers
+            cached = np.load(path, mmap_mode='r')
+            return cached[0], cached[1]
+        vertices, normals = self.compute_vertices()
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, so that a torus started at
+        # the same time never sees a partial file
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, np.stack((vertices, normals)))
+        os.replace(tmp, path)
         return vertices, normals
 
-    def compute_colors(self):
-        """ Compute vertices for the torus. 
-            returns np float32 array of n coords (x, y, z): shape (3*n, )
+    def compute_indices(self):
+        """ Compute GL_TRIANGLES indices: two triangles per GOL cell.
+            returns np uint32 array of shape (6*N*M, )
         """
 
-        R, r, N, M = self.R, self.r, self.N, self.M
-
-        # The points on the ring are generated on the X-Z plane.
-        # Then they are rotated and translated into the correct 
-        # position on the torus.
-
-        # for all N rings around the torus 
-        for i in range(N):
-
-            # for all M points around a ring 
-            for j in range(M+1):
-
-                # j value 
-                jj = j % M
-
-                # store colors - same color applies to (V_i_j, V_ip1_j)
-                col = self.colors_dict[(i, jj)]
-                # get index into array                 
-                index = 3*(2*i*(M+1) + 2*j)
-                # set color 
-                self.colors[index:index+3] = col
-                self.colors[index+3:index+6] = col
-
-
-    def setup_vao(self, vertices, normals, colors):
+        N, M = self.N, self.M
+
+        # corners of cell (i, j): A = V_i_j, B = V_ip1_j, C = V_i_jp1
+        # and D = V_ip1_jp1, wrapping around
+        i = np.arange(N)[:, np.newaxis]
+        j = np.arange(M)[np.newaxis, :]
+        A = i*M + j
+        B = ((i + 1) % N)*M + j
+        C = i*M + (j + 1) % M
+        D = ((i + 1) % N)*M + (j + 1) % M
+        # triangles (A, B, D) and (A, D, C) - both start with A, so with
+        # the first vertex convention they are flat shaded with the
+        # color of V_i_j, which is the color of cell (i, j)
+        indices = np.stack((A, B, D, A, D, C), axis=-1)
+        return indices.astype(np.uint32).reshape(-1)
+
+    def setup_vao(self, vertices, normals, colors, indices):
         # set up vertex array object (VAO)
         self.vao = glGenVertexArrays(1)
         glBindVertexArray(self.vao)
@@ -270,6 +325,35 @@ class Torus:
         # set buffer data pointer
         glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, 0, None)
 
+        # --------
+        # indices
+        # --------
+        self.indexBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        # set buffer data - the binding is part of the VAO state
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices,
+                     GL_STATIC_DRAW)
+
+        if self.gpu_state:
+            # --------
+            # cells
+            # --------
+            # (i, j) of each vertex's cell, uploaded once
+            cells = np.indices((self.N, self.M), np.int32)
+            cells = np.ascontiguousarray(cells.transpose(1, 2, 0))
+            self.cellBuffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.cellBuffer)
+            # set buffer data
+            glBufferData(GL_ARRAY_BUFFER, cells.nbytes, cells,
+                         GL_STATIC_DRAW)
+            # enable cell attribute array
+            glEnableVertexAttribArray(1)
+            # set buffer data pointer - integer attribute
+            glVertexAttribIPointer(1, 2, GL_INT, 0, None)
+            # unbind VAO
+            glBindVertexArray(0)
+            return
+
         # --------
         # colors
         # --------
@@ -286,15 +370,39 @@ class Torus:
         # unbind VAO
         glBindVertexArray(0)
 
+    def setup_state_texture(self):
+        """create the NX x NY one byte per cell GOL state texture"""
+        self.stateTexture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.stateTexture)
+        # cells are fetched exactly - no filtering
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        # rows of NY bytes, not padded to 4 bytes
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        # width NY and height NX - all cells dead to start with
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_R8, self.NY, self.NX, 0, GL_RED,
+                     GL_UNSIGNED_BYTE, np.zeros((self.NX, self.NY), np.uint8))
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def set_state(self, grid):
+        """upload an (NX, NY) 0/1 GOL grid to the state texture"""
+        grid = np.ascontiguousarray(grid, np.uint8)
+        glBindTexture(GL_TEXTURE_2D, self.stateTexture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.NY, self.NX, GL_RED,
+                        GL_UNSIGNED_BYTE, grid)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
     def set_colors(self, colors):
-        self.colors_dict = colors
-        self.recalc_colors()
+        """set vertex colors from an (NX, NY, 3) array of cell colors
+        - they are uploaded on the next step()"""
+        # one vertex per cell, in the same order
+        self.colors[:] = colors.reshape(-1)
 
     def recalc_colors(self):
 
-        # get colors 
-        self.compute_colors()
-
         # bind VAO
         glBindVertexArray(self.vao)
         # --------
@@ -308,8 +416,10 @@ class Torus:
 
     # step
     def step(self):
-        # recompute colors
-        self.recalc_colors()
+        # upload colors - in GPU state mode, set_state() has
+        # already updated the texture
+        if not self.gpu_state:
+            self.recalc_colors()
 
     # render 
     def render(self, pMatrix, mvMatrix):        
@@ -322,10 +432,21 @@ class Torus:
         # set modelview matrix
         glUniformMatrix4fv(self.mvMatrixUniform, 1, GL_FALSE, mvMatrix)
 
+        if self.gpu_state:
+            # bind state texture to unit 0
+            glActiveTexture(GL_TEXTURE0)
+            glBindTexture(GL_TEXTURE_2D, self.stateTexture)
+            glUniform1i(self.stateUniform, 0)
+
         # bind VAO
         glBindVertexArray(self.vao)
         # draw 
-        glMultiDrawArrays(GL_TRIANGLE_STRIP, self.first_indices, self.counts, self.N)
+        if self.instanced:
+            # 6 vertices for each of the NX*NY cells
+            glDrawArraysInstanced(GL_TRIANGLES, 0, 6, self.N*self.M)
+        else:
+            glDrawElements(GL_TRIANGLES, self.n_indices, GL_UNSIGNED_INT,
+                           None)
         # unbind VAO
         glBindVertexArray(0)
 
@@ -9,12 +9,13 @@ Website: electronut.in
 
 import random, argparse
 import numpy as np
-import math
 import turtle
 import random
 from PIL import Image
 from datetime import datetime    
 
+from spirocurve import nRotations, spiroPoints
+
 # A class that draws a spirograph
 class Spiro:
     # constructor
@@ -44,11 +45,12 @@ class Spiro:
         self.r = int(r)
         self.l = l
         self.col = col
-        # reduce r/R to smallest form by dividing with GCD
-        gcdVal = math.gcd(self.r, self.R)
-        self.nRot = self.r//gcdVal
+        # number of rotations until the curve closes
+        self.nRot = nRotations(self.R, self.r)
         # get ratio of radii
         self.k = r/float(R)
+        # compute all points of the curve up front
+        self.points = spiroPoints(self.R, self.r, self.l, self.step)
         # set color
         self.t.color(*col)
         # current angle
@@ -62,10 +64,7 @@ class Spiro:
         self.t.showturtle()
         # go to first point
         self.t.up()
-        R, k, l = self.R, self.k, self.l
-        a = 0.0
-        x = R*((1-k)*math.cos(a) + l*k*math.cos((1-k)*a/k))
-        y = R*((1-k)*math.sin(a) - l*k*math.sin((1-k)*a/k))
+        x, y = self.points[0].tolist()
         try:
             self.t.setpos(self.xc + x, self.yc + y)
         except:
@@ -76,11 +75,7 @@ class Spiro:
     # draw the whole thing
     def draw(self):
         # draw rest of points
-        R, k, l = self.R, self.k, self.l
-        for i in range(0, 360*self.nRot + 1, self.step):
-            a = math.radians(i)
-            x = R*((1-k)*math.cos(a) + l*k*math.cos((1-k)*a/k))
-            y = R*((1-k)*math.sin(a) - l*k*math.sin((1-k)*a/k))
+        for (x, y) in self.points.tolist():
             try:
                 self.t.setpos(self.xc + x, self.yc + y)
             except:
@@ -96,12 +91,9 @@ class Spiro:
             return
         # increment angle
         self.a += self.step
-        # draw step
-        R, k, l = self.R, self.k, self.l
-        # set angle
-        a = math.radians(self.a)
-        x = self.R*((1-k)*math.cos(a) + l*k*math.cos((1-k)*a/k))
-        y = self.R*((1-k)*math.sin(a) - l*k*math.sin((1-k)*a/k))
+        # draw step - the point at angle self.a
+        i = min(self.a//self.step, len(self.points) - 1)
+        x, y = self.points[i].tolist()
         try:
             self.t.setpos(self.xc + x, self.yc + y)
         except:
@@ -0,0 +1,128 @@
+"""
+spirobatch.py
+
+Generates a gallery of spirograph images: random or grid-sampled
+parameter sets are rendered headlessly in a process pool, and the
+parameters of each image are written to a manifest.
+
+Author: Mahesh Venkitachalam
+Website: electronut.in
+"""
+
+import argparse
+import colorsys
+import csv, json
+import itertools
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from spirorender import randomParams, renderSpiros
+
+def randomSets(K, size, seed=None):
+    """returns K random (R, r, l, col) parameter sets for spirographs
+    centered on a canvas of the given size"""
+    rng = random.Random(seed)
+    sets = [randomParams(*size, rng) for i in range(K)]
+    # the random centre (xc, yc) is not used
+    return [(R, r, l, col) for (xc, yc, col, R, r, l) in sets]
+
+def gridSets(Rs, rs, ls):
+    """returns (R, r, l, col) parameter sets for all combinations of
+    Rs, rs and ls with r < R, with colors spread around the hue circle"""
+    combos = [(R, r, l) for (R, r, l) in itertools.product(Rs, rs, ls)
+              if r < R]
+    return [(R, r, l, colorsys.hsv_to_rgb(i/len(combos), 0.8, 0.7))
+            for (i, (R, r, l)) in enumerate(combos)]
+
+def renderOne(job):
+    """render one image and return its manifest row"""
+    index, (R, r, l, col), outDir, options = job
+    img = renderSpiros([(0, 0, col, R, r, l)], **options)
+    fileName = 'spiro-{:05d}.png'.format(index)
+    img.save(os.path.join(outDir, fileName))
+    return {'file': fileName, 'R': R, 'r': r, 'l': round(l, 4),
+            'red': round(col[0], 4), 'green': round(col[1], 4),
+            'blue': round(col[2], 4)}
+
+def renderBatch(params, outDir, options, nProcs=None):
+    """render an image for each parameter set in a process pool and
+    return the manifest rows. options are passed to renderSpiros()."""
+    os.makedirs(outDir, exist_ok=True)
+    jobs = [(i, p, outDir, options) for (i, p) in enumerate(params)]
+    with Pool(nProcs) as pool:
+        # a few images per task keeps the overhead low and the
+        # workers busy till the end
+        return pool.map(renderOne, jobs, chunksize=4)
+
+def saveManifest(rows, fileName):
+    """write manifest rows as JSON if fileName ends in .json, else
+    as CSV"""
+    if fileName.endswith('.json'):
+        with open(fileName, 'w') as f:
+            json.dump(rows, f, indent=1)
+    else:
+        with open(fileName, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+# main() function
+def main():
+    parser = argparse.ArgumentParser(description="Renders a gallery of "
+                                     "spirograph images.")
+    # add arguments
+    parser.add_argument('--count', dest='K', type=int, default=16,
+                        help="number of random images")
+    parser.add_argument('--seed', dest='seed', type=int, required=False)
+    parser.add_argument('--grid', action='store_true', required=False,
+                        help="render all combinations of --R, --r and --l "
+                             "instead of random parameters")
+    parser.add_argument('--R', dest='Rs', type=int, nargs='+',
+                        default=[100, 150, 200])
+    parser.add_argument('--r', dest='rs', type=int, nargs='+',
+                        default=[30, 50, 70, 90])
+    parser.add_argument('--l', dest='ls', type=float, nargs='+',
+                        default=[0.3, 0.6, 0.9])
+    parser.add_argument('--size', nargs=2, dest='size', type=int,
+                        default=[450, 450],
+                        help="canvas width and height")
+    parser.add_argument('--scale', dest='scale', type=float, default=1.0,
+                        help="image pixels per canvas unit")
+    parser.add_argument('--line-width', dest='lineWidth', type=float,
+                        default=1.0)
+    parser.add_argument('--step', dest='step', type=int, default=5,
+                        help="angle step in degrees")
+    parser.add_argument('--procs', dest='nProcs', type=int, default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument('--out-dir', dest='outDir', default='gallery')
+    parser.add_argument('--manifest', dest='manifest',
+                        default='manifest.csv',
+                        help="manifest file name in the output folder "
+                             "(.csv or .json)")
+    args = parser.parse_args()
+
+    if args.grid:
+        params = gridSets(args.Rs, args.rs, args.ls)
+    else:
+        params = randomSets(args.K, args.size, args.seed)
+    if not params:
+        parser.error('no parameter sets to render')
+    options = {'size': args.size, 'scale': args.scale,
+               'lineWidth': args.lineWidth, 'step': args.step}
+
+    nProcs = args.nProcs or os.cpu_count()
+    print('rendering {} images on {} processes...'.format(len(params),
+                                                         nProcs))
+    t0 = time.perf_counter()
+    rows = renderBatch(params, args.outDir, options, nProcs)
+    elapsed = time.perf_counter() - t0
+    manifest = os.path.join(args.outDir, args.manifest)
+    saveManifest(rows, manifest)
+    print('{} images in {:.1f}s ({:.1f} images/s), manifest written to '
+          '{}'.format(len(rows), elapsed, len(rows)/elapsed, manifest))
+
+# call main
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+spirocurve.py
+
+Computes spirograph curves (hypotrochoids) with NumPy, for any
+renderer - the turtle animation in spiro.py, or headless ones.
+
+Author: Mahesh Venkitachalam
+Website: electronut.in
+"""
+
+import math
+import numpy as np
+
+def nRotations(R, r):
+    """returns the number of turns of the inner circle after which
+    the curve closes"""
+    # reduce r/R to smallest form by dividing with GCD
+    return int(r)//math.gcd(int(r), int(R))
+
+def spiroPoints(R, r, l, step=5):
+    """returns the (n, 2) float32 array of points of the spirograph
+    with outer radius R, inner radius r and hole ratio l, centered
+    at the origin, at angles 0, step, 2*step... degrees until the
+    curve closes"""
+    R, r = int(R), int(r)
+    k = r/float(R)
+    a = np.radians(np.arange(0, 360*nRotations(R, r) + 1, step))
+    points = np.empty((len(a), 2), np.float32)
+    points[:, 0] = R*((1-k)*np.cos(a) + l*k*np.cos((1-k)*a/k))
+    points[:, 1] = R*((1-k)*np.sin(a) - l*k*np.sin((1-k)*a/k))
+    return points
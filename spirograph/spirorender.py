@@ -0,0 +1,122 @@
+"""
+spirorender.py
+
+Renders spirographs straight to PNG images, without turtle or a
+display, at any resolution. Curves are drawn on a supersampled image
+that is then scaled down, which anti-aliases the lines.
+
+Author: Mahesh Venkitachalam
+Website: electronut.in
+"""
+
+import argparse
+import random
+import numpy as np
+from PIL import Image, ImageDraw
+
+from spirocurve import spiroPoints
+
+def randomParams(width, height, rng=random):
+    """returns random spiro parameters (xc, yc, col, R, r, l) for a
+    width x height canvas, like SpiroAnimator.genRandomParams()"""
+    R = rng.randint(50, min(width, height)//2)
+    r = rng.randint(10, 9*R//10)
+    l = rng.uniform(0.1, 0.9)
+    xc = rng.randint(-width//2, width//2)
+    yc = rng.randint(-height//2, height//2)
+    col = (rng.random(),
+           rng.random(),
+           rng.random())
+    return (xc, yc, col, R, r, l)
+
+# largest supersampled image, in pixels (48 MB of RGB)
+maxSuperPixels = 4096*4096
+
+def renderSpiros(spiros, size=(800, 800), scale=1.0, lineWidth=1.0,
+                 step=5, supersample=4, background=(255, 255, 255)):
+    """returns a PIL image of spirographs. spiros is a list of
+    (xc, yc, col, R, r, l) parameters, as for Spiro, on a canvas of
+    size (width, height) with the origin at the centre and y up.
+    the image is scale times the canvas size, and curves are drawn
+    with points every step degrees. supersample is lowered for large
+    images so that the supersampled image has at most maxSuperPixels
+    pixels - down to 1 (no supersampling) for images that big."""
+    width, height = size
+    outSize = (int(round(width*scale)), int(round(height*scale)))
+    # supersampled image
+    supersample = min(supersample,
+                      (maxSuperPixels/(outSize[0]*outSize[1]))**0.5)
+    supersample = max(supersample, 1.0)
+    ss = scale*supersample
+    W, H = int(round(width*ss)), int(round(height*ss))
+    img = Image.new('RGB', (W, H), background)
+    draw = ImageDraw.Draw(img)
+    lw = max(1, int(round(lineWidth*ss)))
+    for (xc, yc, col, R, r, l) in spiros:
+        points = spiroPoints(R, r, l, step)
+        # canvas to image coordinates, all points at once
+        xy = np.empty_like(points)
+        xy[:, 0] = W/2 + ss*(xc + points[:, 0])
+        xy[:, 1] = H/2 - ss*(yc + points[:, 1])
+        color = tuple(int(round(255*c)) for c in col)
+        draw.line(xy.ravel().tolist(), fill=color, width=lw, joint='curve')
+    if (W, H) == outSize:
+        return img
+    # filter down to the final size
+    return img.resize(outSize, Image.LANCZOS)
+
+# main() function
+def main():
+    descStr = """This program renders spirographs to an image file,
+    without a display.
+
+    Terminology:
+
+    R: radius of outer circle.
+    r: radius of inner circle.
+    l: ratio of hole distance to r.
+    """
+    parser = argparse.ArgumentParser(description=descStr)
+    # add expected arguments
+    parser.add_argument('--sparams', nargs=3, dest='sparams', required=False,
+                        help="The three arguments in sparams: R, r, l.")
+    parser.add_argument('--random', dest='nRandom', type=int, default=4,
+                        required=False,
+                        help="number of random spirographs (default: 4), "
+                             "if --sparams is not given")
+    parser.add_argument('--seed', dest='seed', type=int, required=False)
+    parser.add_argument('--size', nargs=2, dest='size', type=int,
+                        default=[800, 800], required=False,
+                        help="canvas width and height")
+    parser.add_argument('--scale', dest='scale', type=float, default=1.0,
+                        required=False,
+                        help="image pixels per canvas unit")
+    parser.add_argument('--line-width', dest='lineWidth', type=float,
+                        default=1.0, required=False)
+    parser.add_argument('--step', dest='step', type=int, default=5,
+                        required=False,
+                        help="angle step in degrees")
+    parser.add_argument('--supersample', dest='supersample', type=int,
+                        default=4, required=False,
+                        help="supersampling factor (default: 4), lowered "
+                             "for large images")
+    parser.add_argument('--output', dest='output', default='spiro.png',
+                        required=False)
+    args = parser.parse_args()
+
+    if args.sparams:
+        R, r, l = [float(x) for x in args.sparams]
+        # black by default
+        spiros = [(0, 0, (0.0, 0.0, 0.0), R, r, l)]
+    else:
+        rng = random.Random(args.seed)
+        spiros = [randomParams(*args.size, rng) for i in range(args.nRandom)]
+    img = renderSpiros(spiros, args.size, args.scale, args.lineWidth,
+                       args.step, args.supersample)
+    img.save(args.output)
+    print('saved {}x{} image to {}'.format(img.size[0], img.size[1],
+                                            args.output))
+
+# call main
+if __name__ == '__main__':
+    main()